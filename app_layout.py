@@ -1,16 +1,42 @@
+from itertools import islice
+
+from async_data_store import AsyncDataStore
 from board import Board
-from data_store import DataStore
+from change_feed import ChangeEvent
 import flet as ft
+from models import BoardModel
 from sidebar import Sidebar
+from view_cache import ViewCache
+from update_scheduler import schedule_update
+
+# board tiles shown per page of the "Your Boards" grid
+BOARD_TILE_PAGE = 60
 
 
 class AppLayout(ft.Row):
-    def __init__(self, app, page: ft.Page, store: DataStore, *args, **kwargs):
+    def __init__(
+        self,
+        app,
+        page: ft.Page,
+        store: AsyncDataStore,
+        *args,
+        board_cache: ViewCache | None = None,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.app = app
         self.page: ft.Page = page
         self.page.on_resized = self.page_resize
-        self.store: DataStore = store
+        self.store: AsyncDataStore = store
+        # board_id -> record for every board; the Board view is only built
+        # when the board is opened
+        self.boards: dict[int, BoardModel] = {}
+        # board_id -> Board view, for the recently opened boards
+        self.board_views: ViewCache = (
+            ViewCache(cost=Board.size) if board_cache is None else board_cache
+        )
+        # board_id -> changes that arrived while the board was loading
+        self.pending_changes: dict[int, list[ChangeEvent]] = {}
         self.toggle_nav_rail_button = ft.IconButton(
             icon=ft.Icons.ARROW_CIRCLE_LEFT,
             icon_color=ft.Colors.BLUE_GREY_400,
@@ -80,6 +106,7 @@ class AppLayout(ft.Row):
                             border_color=ft.Colors.BLACK26,
                             focused_border_color=ft.Colors.BLUE_ACCENT,
                             suffix_icon=ft.Icons.SEARCH,
+                            on_change=self.search_boards,
                         )
                     ]
                 ),
@@ -87,6 +114,13 @@ class AppLayout(ft.Row):
             ],
             expand=True,
         )
+        # board_id -> tile in board_grid, for the boards currently shown
+        self.board_tiles: dict[int, ft.Container] = {}
+        self.shown_tiles = BOARD_TILE_PAGE
+        self.board_grid = ft.Row([], wrap=True)
+        self.more_boards_button = ft.TextButton(on_click=self.show_more_boards)
+        # bumped by every keystroke in the search field
+        self.search_seq = 0
         self._active_view: ft.Control = self.all_boards_view
 
         self.controls = [self.sidebar, self.toggle_nav_rail_button, self.active_view]
@@ -97,96 +131,221 @@ class AppLayout(ft.Row):
 
     @active_view.setter
     def active_view(self, view):
-        self._active_view = view
+        left, self._active_view = self._active_view, view
+        # a board may have grown while it was on screen, where the cache
+        # never evicts it; now that it is left, its cost counts again
+        if isinstance(left, Board) and left is not view:
+            self.board_views.touch(left.board_id)
         self.controls[-1] = self._active_view
-        self.sidebar.sync_board_destinations()
-        self.page.update()
+        schedule_update(self.page, self)
 
-    def set_board_view(self, i):
-        self.active_view = self.store.get_boards()[i]
-        self.sidebar.bottom_nav_rail.selected_index = i
-        self.sidebar.top_nav_rail.selected_index = None
+    async def open_board(self, model: BoardModel) -> Board:
+        board = self.board_views.get(model.board_id)
+        if board is not None:
+            return board
+        # never opened, or evicted since: build it from the store
+        # changes made while the board loads are replayed onto it; the view
+        # skips the ones its snapshot already has
+        pending = self.pending_changes[model.board_id] = []
+        try:
+            board = await Board.load(self.app, self.store, model, self.page)
+        finally:
+            del self.pending_changes[model.board_id]
+        for event in pending:
+            board.apply_change(event)
+        # the board may have been removed while it loaded
+        if model.board_id in self.boards:
+            self.board_views.put(model.board_id, board)
+        return board
+
+    def adopt_board(self, model: BoardModel):
+        # a board's new record after a rename; its view, if built, takes it too
+        if model.board_id in self.boards:
+            self.boards[model.board_id] = model
+        board = self.board_views.peek(model.board_id)
+        if board is not None:
+            board.model = model
+
+    async def set_board_view(self, board_id: int):
+        # the sidebar is kept in step with the boards by the changes
+        # themselves, so switching boards only moves the selection
+        self.active_view = await self.open_board(self.boards[board_id])
+        self.sidebar.select_board(board_id)
         self.page_resize()
-        self.page.update()
+        schedule_update(self.page, self)
 
-    def set_all_boards_view(self):
+    async def set_all_boards_view(self):
         self.active_view = self.all_boards_view
-        self.hydrate_all_boards_view()
-        self.sidebar.top_nav_rail.selected_index = 0
-        self.sidebar.bottom_nav_rail.selected_index = None
-        self.page.update()
+        # pages opened with "Show more" are dropped again
+        self.shown_tiles = BOARD_TILE_PAGE
+        await self.hydrate_all_boards_view()
+        self.sidebar.select_top(0)
+        schedule_update(self.page, self)
 
-    def set_members_view(self):
+    async def set_members_view(self):
         self.active_view = self.members_view
-        self.sidebar.top_nav_rail.selected_index = 1
-        self.sidebar.bottom_nav_rail.selected_index = None
-        self.page.update()
+        self.sidebar.select_top(1)
+        schedule_update(self.page, self)
 
     def page_resize(self, e=None):
         if type(self.active_view) is Board:
             self.active_view.resize(
                 self.sidebar.visible, self.page.width, self.page.height
             )
-        self.page.update()
 
-    def hydrate_all_boards_view(self):
-        self.all_boards_view.controls[-1] = ft.Row(
-            [
-                ft.Container(
-                    content=ft.Row(
-                        [
-                            ft.Container(
-                                content=ft.Text(value=b.name),
-                                data=b,
-                                expand=True,
-                                on_click=self.board_click,
-                            ),
-                            ft.Container(
-                                content=ft.PopupMenuButton(
-                                    items=[
-                                        ft.PopupMenuItem(
-                                            content=ft.Text(
-                                                value="Delete",
-                                                theme_style=ft.TextThemeStyle.LABEL_MEDIUM,
-                                                text_align=ft.TextAlign.CENTER,
-                                            ),
-                                            on_click=self.app.delete_board,
-                                            data=b,
-                                        ),
-                                        ft.PopupMenuItem(),
-                                        ft.PopupMenuItem(
-                                            content=ft.Text(
-                                                value="Archive",
-                                                theme_style=ft.TextThemeStyle.LABEL_MEDIUM,
-                                                text_align=ft.TextAlign.CENTER,
-                                            ),
-                                        ),
-                                    ]
+    async def hydrate_all_boards_view(self):
+        # rebuild the grid and the sidebar from self.boards; tiles are cached
+        # by board id and patched in place, and only the first shown_tiles
+        # boards get tiles at all. A single board's change goes through
+        # board_added, board_updated or board_removed instead.
+        shown = list(islice(self.boards.values(), self.shown_tiles))
+        tiles = []
+        for b in shown:
+            tile = self.board_tiles.get(b.board_id)
+            if tile is None:
+                tile = self.board_tile(b)
+            elif tile.data is not b or tile.content.controls[0].content.value != b.name:
+                self.patch_board_tile(tile, b)
+            tiles.append(tile)
+        self.board_tiles = {b.board_id: tile for b, tile in zip(shown, tiles)}
+        if len(self.boards) > len(shown):
+            tiles.append(self.more_boards_button)
+        if tiles != self.board_grid.controls:
+            self.board_grid.controls = tiles
+        self.sync_more_boards()
+        self.all_boards_view.controls[-1] = self.board_grid
+        self.sidebar.sync_board_destinations()
+
+    def board_added(self, b: BoardModel):
+        # the tiles are always the first boards in order; a new board, which
+        # comes last, gets one only if every other board already has one
+        self.boards.setdefault(b.board_id, b)
+        if len(self.board_tiles) == len(self.boards) - 1 and (
+            len(self.board_tiles) < self.shown_tiles
+        ):
+            self.board_tiles[b.board_id] = tile = self.board_tile(b)
+            self.board_grid.controls.insert(len(self.board_tiles) - 1, tile)
+        self.sync_more_boards()
+        self.sidebar.add_board_destination(b)
+
+    def board_updated(self, b: BoardModel):
+        self.adopt_board(b)
+        tile = self.board_tiles.get(b.board_id)
+        if tile is not None:
+            self.patch_board_tile(tile, b)
+        self.sidebar.patch_board_destination(b)
+
+    def board_removed(self, board_id: int):
+        self.boards.pop(board_id, None)
+        self.board_views.pop(board_id, None)
+        tile = self.board_tiles.pop(board_id, None)
+        if tile is not None:
+            self.board_grid.controls.remove(tile)
+        self.sync_more_boards()
+        self.sidebar.remove_board_destination(board_id)
+
+    def sync_more_boards(self):
+        # the "Show more" button closes the grid while boards lack tiles
+        hidden = len(self.boards) - len(self.board_tiles)
+        controls = self.board_grid.controls
+        shown = bool(controls) and controls[-1] is self.more_boards_button
+        if hidden:
+            self.more_boards_button.text = f"Show more ({hidden})"
+            if not shown:
+                controls.append(self.more_boards_button)
+        elif shown:
+            controls.pop()
+
+    def board_tile(self, b: BoardModel) -> ft.Container:
+        return ft.Container(
+            content=ft.Row(
+                [
+                    ft.Container(
+                        content=ft.Text(value=b.name),
+                        data=b,
+                        expand=True,
+                        on_click=self.board_click,
+                    ),
+                    ft.Container(
+                        content=ft.PopupMenuButton(
+                            items=[
+                                ft.PopupMenuItem(
+                                    content=ft.Text(
+                                        value="Delete",
+                                        theme_style=ft.TextThemeStyle.LABEL_MEDIUM,
+                                        text_align=ft.TextAlign.CENTER,
+                                    ),
+                                    on_click=self.app.delete_board,
+                                    data=b,
                                 ),
-                                padding=ft.padding.only(right=-10),
-                                border_radius=ft.border_radius.all(3),
-                            ),
-                        ],
-                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                                ft.PopupMenuItem(),
+                                ft.PopupMenuItem(
+                                    content=ft.Text(
+                                        value="Archive",
+                                        theme_style=ft.TextThemeStyle.LABEL_MEDIUM,
+                                        text_align=ft.TextAlign.CENTER,
+                                    ),
+                                ),
+                            ]
+                        ),
+                        padding=ft.padding.only(right=-10),
+                        border_radius=ft.border_radius.all(3),
                     ),
-                    border=ft.border.all(1, ft.Colors.BLACK38),
-                    border_radius=ft.border_radius.all(5),
-                    bgcolor=ft.Colors.WHITE60,
-                    padding=ft.padding.all(10),
-                    width=250,
-                    data=b,
-                )
-                for b in self.store.get_boards()
-            ],
-            wrap=True,
+                ],
+                alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+            ),
+            border=ft.border.all(1, ft.Colors.BLACK38),
+            border_radius=ft.border_radius.all(5),
+            bgcolor=ft.Colors.WHITE60,
+            padding=ft.padding.all(10),
+            width=250,
+            data=b,
         )
-        self.sidebar.sync_board_destinations()
 
-    def board_click(self, e):
-        self.sidebar.bottom_nav_change(self.store.get_boards().index(e.control.data))
+    def patch_board_tile(self, tile: ft.Container, b: BoardModel):
+        name, menu = tile.content.controls
+        name.content.value = b.name
+        name.data = tile.data = menu.content.items[0].data = b
+
+    async def show_more_boards(self, e):
+        self.shown_tiles += BOARD_TILE_PAGE
+        await self.hydrate_all_boards_view()
+        schedule_update(self.page, self.board_grid)
+
+    async def search_boards(self, e):
+        query = e.control.value
+        self.search_seq += 1
+        seq = self.search_seq
+        if query.strip():
+            hits = await self.store.search(query)
+            # searches can finish out of order; only the one for the field's
+            # current text may fill the view
+            if seq != self.search_seq or e.control.value != query:
+                return
+            self.all_boards_view.controls[-1] = ft.Column(
+                [
+                    ft.ListTile(
+                        title=ft.Text(hit.text),
+                        subtitle=ft.Text(
+                            f"{hit.kind} in {self.boards[hit.board_id].name}"
+                        ),
+                        data=self.boards[hit.board_id],
+                        on_click=self.board_click,
+                    )
+                    for hit in hits
+                    if hit.board_id in self.boards
+                ]
+                or [ft.Text("No matches")],
+            )
+        else:
+            await self.hydrate_all_boards_view()
+        schedule_update(self.page, self.all_boards_view, self.sidebar)
+
+    async def board_click(self, e):
+        self.sidebar.go_to_board(e.control.data.board_id)
 
     def toggle_nav_rail(self, e):
         self.sidebar.visible = not self.sidebar.visible
         self.toggle_nav_rail_button.selected = not self.toggle_nav_rail_button.selected
         self.page_resize()
-        self.page.update()
\ No newline at end of file
+        schedule_update(self.page, self)
\ No newline at end of file
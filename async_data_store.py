@@ -0,0 +1,104 @@
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from change_feed import Subscription
+    from data_store import DataStore
+    from models import BoardModel, BoardListModel, ItemModel
+    from search_index import SearchHit
+    from user import User
+
+
+class AsyncDataStore:
+
+    async def batch(self, fn: Callable[["DataStore"], object]):
+        raise NotImplementedError
+
+    async def read(self, fn: Callable[["DataStore"], object]):
+        raise NotImplementedError
+
+    async def subscribe(self, board_id=None, max_pending=256) -> "Subscription":
+        raise NotImplementedError
+
+    async def search(self, query, limit=20) -> list["SearchHit"]:
+        raise NotImplementedError
+
+    async def add_board(self, model) -> "BoardModel":
+        raise NotImplementedError
+
+    async def get_board(self, id) -> "BoardModel":
+        raise NotImplementedError
+
+    async def get_boards(self) -> list["BoardModel"]:
+        raise NotImplementedError
+
+    async def update_board(self, model, update) -> "BoardModel":
+        raise NotImplementedError
+
+    async def remove_board(self, board) -> None:
+        raise NotImplementedError
+
+    async def add_user(self, model) -> None:
+        raise NotImplementedError
+
+    async def get_users(self) -> list["User"]:
+        raise NotImplementedError
+
+    async def get_user(self, id) -> "User":
+        raise NotImplementedError
+
+    async def remove_user(self, id) -> None:
+        raise NotImplementedError
+
+    async def add_list(self, board, model, before=None) -> "BoardListModel":
+        raise NotImplementedError
+
+    async def get_lists(self) -> list["BoardListModel"]:
+        raise NotImplementedError
+
+    async def get_list(self, id) -> "BoardListModel":
+        raise NotImplementedError
+
+    async def get_lists_by_board(self, board) -> list["BoardListModel"]:
+        raise NotImplementedError
+
+    async def update_list(self, model, update) -> "BoardListModel":
+        raise NotImplementedError
+
+    async def move_list(self, board, id, before=None) -> None:
+        raise NotImplementedError
+
+    async def remove_list(self, board, id) -> None:
+        raise NotImplementedError
+
+    async def add_item(self, board_list, model, before=None) -> "ItemModel":
+        raise NotImplementedError
+
+    async def get_items(self, board_list) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    async def get_item(self, id) -> "ItemModel":
+        raise NotImplementedError
+
+    async def get_items_by_board(self, board) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    async def update_item(self, model, update) -> "ItemModel":
+        raise NotImplementedError
+
+    async def move_item(self, board_list, id, before=None) -> "ItemModel":
+        raise NotImplementedError
+
+    async def remove_item(self, board_list, id) -> None:
+        raise NotImplementedError
+
+    async def add_items(self, board_list, models, before=None) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    async def move_items(self, src_list, dst_list, ids, before=None) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    async def remove_items(self, board_list, ids) -> None:
+        raise NotImplementedError
+
+    async def bulk_update_labels(self, ids, add=(), remove=()) -> None:
+        raise NotImplementedError
@@ -1,18 +1,31 @@
-import itertools
 import flet as ft
+from async_data_store import AsyncDataStore
 from board_list import BoardList
-from data_store import DataStore
+from change_feed import ChangeEvent, ChangeKind
+from debounced_input import DebouncedInput
+from label_index import LabelIndex
+from models import BoardModel, BoardListModel, ItemModel
+from update_scheduler import schedule_update
 
 
 class Board(ft.Container):
-    id_counter = itertools.count()
 
-    def __init__(self, app, store: DataStore, name: str, page: ft.Page):
+    def __init__(
+        self,
+        app,
+        store: AsyncDataStore,
+        model: BoardModel,
+        page: ft.Page,
+        lists: list[tuple[BoardListModel, list[ItemModel]]] = (),
+    ):
         self.page: ft.Page = page
-        self.board_id = next(Board.id_counter)
-        self.store: DataStore = store
+        self.model = model
+        self.store: AsyncDataStore = store
         self.app = app
-        self.name = name
+        # board_list_id -> BoardList view
+        self.lists: dict[int, BoardList] = {}
+        # the lists register their cards here as they are built
+        self.label_index = LabelIndex()
         self.add_list_button = ft.FloatingActionButton(
             icon=ft.Icons.ADD, text="add a list", height=30, on_click=self.create_list
         )
@@ -44,8 +57,8 @@ class Board(ft.Container):
             width=(self.app.page.width - 310),
             height=(self.app.page.height - 95),
         )
-        for l in self.store.get_lists_by_board(self.board_id):
-            self.add_list(l)
+        for l, items in lists:
+            self.insert_list_view(BoardList(self, self.store, l, self.page, items))
 
         super().__init__(
             content=ft.Column(
@@ -67,10 +80,39 @@ class Board(ft.Container):
             height=self.app.page.height,
         )
 
+    @classmethod
+    async def load(cls, app, store: AsyncDataStore, model: BoardModel, page: ft.Page):
+        # one round trip to the store for every list and card on the board
+        lists = await store.read(
+            lambda s: [
+                (l, s.get_items(l.board_list_id))
+                for l in s.get_lists_by_board(model.board_id)
+            ]
+        )
+        return cls(app, store, model, page, lists)
+
+    @property
+    def board_id(self):
+        return self.model.board_id
+
+    @property
+    def name(self):
+        return self.model.name
+
+    def size(self) -> int:
+        # rough weight of the view: lists plus the card rows they have built
+        return sum(1 + len(l.rows) for l in self.lists.values())
+
+    def remeasure(self):
+        # lists or card rows were added or dropped; the view cache re-reads
+        # the size against its budget
+        self.app.board_views.touch(self.board_id)
+
     def resize(self, nav_rail_extended, width, height):
         self.board_lists.width = (width - 310) if nav_rail_extended else (width - 50)
         self.height = height
-        self.update()
+        # a board being opened is not mounted yet, so self.page is still None
+        schedule_update(self.app.page, self)
 
     def create_list(self, e):
 
@@ -101,7 +143,7 @@ class Board(ft.Container):
                     v.border = ft.border.all(3, ft.Colors.BLACK26)
                 else:
                     v.border = None
-            dialog.content.update()
+            schedule_update(self.page, dialog.content)
 
         color_options = ft.GridView(runs_count=3, max_extent=40, data="", height=150)
 
@@ -109,26 +151,25 @@ class Board(ft.Container):
             v.on_click = set_color
             color_options.controls.append(v)
 
-        def close_dlg(e):
-            if (hasattr(e.control, "text") and not e.control.text == "Cancel") or (
-                type(e.control) is ft.TextField and e.control.value != ""
-            ):
-                new_list = BoardList(
-                    self,
-                    self.store,
-                    dialog_text.value,
-                    self.page,
-                    color=color_options.data,
+        async def close_dlg(e):
+            # the Create button's state trails typing by DebouncedInput.QUIET,
+            # so the name itself is checked here
+            named = bool((dialog_text.value or "").strip())
+            if named and getattr(e.control, "text", None) != "Cancel":
+                await self.add_list(
+                    BoardListModel(
+                        self.board_id, dialog_text.value, color=color_options.data
+                    )
                 )
-                self.add_list(new_list)
             self.page.close(dialog)
 
-        def textfield_change(e):
-            if dialog_text.value == "":
-                create_button.disabled = True
-            else:
-                create_button.disabled = False
-            self.page.update()
+        def set_can_create(can_create):
+            create_button.disabled = not can_create
+            schedule_update(self.page, create_button)
+
+        textfield_change = DebouncedInput(
+            self.page, lambda title: bool(title.strip()), set_can_create, initial=False
+        )
 
         dialog_text = ft.TextField(
             label="New List Name", on_submit=close_dlg, on_change=textfield_change
@@ -159,15 +200,82 @@ class Board(ft.Container):
         self.page.open(dialog)
         dialog_text.focus()
 
-    def remove_list(self, list: BoardList, e):
+    async def remove_list(self, list: BoardList, e):
+        await self.store.remove_list(self.board_id, list.board_list_id)
+        self.drop_list_view(list)
+        self.remeasure()
+        schedule_update(self.page, self.board_lists)
+
+    async def add_list(self, model: BoardListModel):
+        model = await self.store.add_list(self.board_id, model)
+        self.insert_list_view(BoardList(self, self.store, model, self.page))
+        self.remeasure()
+        schedule_update(self.page, self.board_lists)
+
+    def insert_list_view(self, list: BoardList, before: int | None = None):
+        if before in self.lists:
+            self.board_lists.controls.insert(
+                self.board_lists.controls.index(self.lists[before]), list
+            )
+        else:
+            self.board_lists.controls.insert(-1, list)
+        self.lists[list.board_list_id] = list
+
+    def drop_list_view(self, list: BoardList):
         self.board_lists.controls.remove(list)
-        self.store.remove_list(self.board_id, list.board_list_id)
-        self.page.update()
+        del self.lists[list.board_list_id]
+        for item_id in list.cards.keys():
+            self.label_index.remove(item_id)
+
+    def apply_change(self, event: ChangeEvent):
+        # a change made by another session to this board
+        list = self.lists.get(event.list_id)
+        if event.kind is ChangeKind.LIST_ADDED:
+            if list is None:
+                self.insert_list_view(
+                    BoardList(self, self.store, event.model, self.page), event.before
+                )
+        elif event.kind is ChangeKind.LIST_UPDATED:
+            if list is not None:
+                list.model = event.model
+                list.refresh_title()
+        elif event.kind is ChangeKind.LIST_MOVED:
+            if list is not None:
+                self.board_lists.controls.remove(list)
+                del self.lists[event.list_id]
+                self.insert_list_view(list, event.before)
+        elif event.kind is ChangeKind.LIST_REMOVED:
+            if list is not None:
+                self.drop_list_view(list)
+        elif event.kind is ChangeKind.ITEM_MOVED and event.from_list != event.list_id:
+            # the card's row moves with it rather than being rebuilt
+            source = self.lists.get(event.from_list)
+            row = None
+            if source is not None and event.item_id in source.cards:
+                row = source.release_card(event.item_id)
+            if list is None:
+                self.label_index.remove(event.item_id)
+            elif event.item_id in list.cards:
+                list.apply_change(event)
+            elif event.model is not None:
+                list.insert_card(event.model, list.known_card(event.before), row)
+        elif list is not None:
+            list.apply_change(event)
 
-    def add_list(self, list):
-        self.board_lists.controls.insert(-1, list)
-        self.store.add_list(self.board_id, list)
-        self.page.update()
+    async def move_list(self, list: BoardList, target: BoardList):
+        if list is target:
+            return
+        controls = self.board_lists.controls
+        from_index = controls.index(list)
+        to_index = controls.index(target)
+        controls.insert(to_index, controls.pop(from_index))
+        # the add list button is always last, so there is always a next control
+        before = controls[to_index + 1].data
+        await self.store.move_list(
+            self.board_id,
+            list.board_list_id,
+            before.board_list_id if isinstance(before, BoardList) else None,
+        )
 
     def color_option_creator(self, color: str):
         return ft.Container(
@@ -181,8 +289,10 @@ class Board(ft.Container):
         )
 
     def show_tags_popup(self, e):
-        labels = self.get_all_labels()
-        checkboxes = [ft.Checkbox(label=label, on_change=self.filter_by_label) for label in labels]
+        checkboxes = [
+            ft.Checkbox(label=f"{label} ({count})", data=label, on_change=self.filter_by_label)
+            for label, count in self.label_index.catalog().items()
+        ]
 
         dialog = ft.AlertDialog(
             title=ft.Text("Filter by Tags"),
@@ -190,18 +300,15 @@ class Board(ft.Container):
         )
         self.page.open(dialog)
 
-    def get_all_labels(self):
-        labels = set()
-        for board_list in self.store.get_lists_by_board(self.board_id):
-            for item in self.store.get_items(board_list.board_list_id):
-                labels.update(item.labels)
-        return list(labels)
-
     def filter_by_label(self, e):
-        selected_labels = [checkbox.label for checkbox in e.control.parent.controls if checkbox.value]
-        for board_list in self.store.get_lists_by_board(self.board_id):
-            for item in self.store.get_items(board_list.board_list_id):
-                item.view.visible = (
-                    True if not selected_labels else any(label in item.labels for label in selected_labels)
-                )
-        self.page.update()
\ No newline at end of file
+        selected_labels = [checkbox.data for checkbox in e.control.parent.controls if checkbox.value]
+        shown, hidden = self.label_index.filter(selected_labels)
+        # only the cards whose visibility flipped are sent to the client
+        for models, visible in ((shown, True), (hidden, False)):
+            for item in models:
+                # cards outside a virtual list's window pick up their
+                # visibility when they are rendered
+                item_view = self.lists[item.board_list_id].item_view(item.item_id)
+                if item_view is not None:
+                    item_view.view.visible = visible
+                    schedule_update(self.page, item_view.view)
\ No newline at end of file
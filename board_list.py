@@ -2,37 +2,67 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from board import Board
-import itertools
 import flet as ft
+from change_feed import ChangeEvent, ChangeKind
 from item import Item
-from data_store import DataStore
+from async_data_store import AsyncDataStore
+from models import BoardListModel, ItemModel
+from ordered_index import OrderedIndex
+from update_scheduler import schedule_update, set_feedback
+
+# lists longer than this only build controls for the cards in view
+VIRTUAL_AFTER = 200
+# estimated height of one card row, for the spacers that stand in for the
+# cards outside the window
+ROW_HEIGHT = 96
+VIEWPORT_ROWS = 8
+OVERSCAN = 4
 
 
 class BoardList(ft.Container):
-    id_counter = itertools.count()
 
     def __init__(
         self,
         board: "Board",
-        store: DataStore,
-        title: str,
+        store: AsyncDataStore,
+        model: BoardListModel,
         page: ft.Page,
-        color: str = "",
+        items: list[ItemModel] = (),
     ):
         self.page: ft.Page = page
-        self.board_list_id = next(BoardList.id_counter)
-        self.store: DataStore = store
+        self.model = model
+        self.store: AsyncDataStore = store
         self.board = board
-        self.title = title
-        self.color = color
         self.items = ft.Column([], tight=True, spacing=4)
-        self.items.controls = self.store.get_items(self.board_list_id)
+        # item_id -> record, in list order
+        self.cards = OrderedIndex()
+        # item_id -> the column wrapping the card and its drop indicator, for
+        # the cards that have controls; in virtual mode that is only the
+        # window [first, first + window) around what is on screen
+        self.rows: dict[int, ft.Column] = {}
+        self.virtual = False
+        self.first = 0
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        if len(items) > VIRTUAL_AFTER:
+            # index every record first and build the one window after
+            for item in items:
+                self.cards.append(item.item_id, item)
+                self.board.label_index.add(item)
+            self.virtualize()
+        else:
+            for item in items:
+                self.insert_card(item)
         self.new_item_field = ft.TextField(
             label="new card name",
             height=50,
             bgcolor=ft.Colors.WHITE,
             on_submit=self.add_item_handler,
-            color=ft.Colors.BLACK
+            color=ft.Colors.BLACK,
+            # enter submits; pasted multi-line text is kept so each line
+            # becomes a card
+            multiline=True,
+            shift_enter=True,
         )
 
         self.end_indicator = ft.Container(
@@ -153,50 +183,218 @@ class BoardList(ft.Container):
         )
         super().__init__(content=self.view, data=self)
 
-    def item_drag_accept(self, e):
+    @property
+    def board_list_id(self):
+        return self.model.board_list_id
+
+    @property
+    def title(self):
+        return self.model.title
+
+    @property
+    def color(self):
+        return self.model.color
+
+    def card_wrapper(self, model: ItemModel):
+        item = Item(self, self.store, model)
+        item.view.visible = self.board.label_index.is_visible(model.item_id)
+        return ft.Column(
+            [
+                ft.Container(
+                    bgcolor=ft.Colors.BLACK26,
+                    border_radius=ft.border_radius.all(30),
+                    height=3,
+                    alignment=ft.alignment.center_right,
+                    width=200,
+                    opacity=0.0,
+                ),
+                item,
+            ]
+        )
+
+    def item_view(self, item_id: int) -> Item | None:
+        # None for a card outside the rendered window
+        row = self.rows.get(item_id)
+        return None if row is None else row.controls[1]
+
+    def insert_card(
+        self,
+        model: ItemModel,
+        before: int | None = None,
+        row: ft.Column | None = None,
+    ):
+        # row is the card's existing row when it moves here from another
+        # list; its Item is reparented instead of rebuilt
+        self.cards.insert_before(model.item_id, model, before)
+        self.board.label_index.add(model)
+        if row is not None:
+            row.controls[1].list = self
+            row.controls[1].model = model
+            self.rows[model.item_id] = row
+        if self.virtual:
+            self.render_window()
+            return
+        if row is None:
+            row = self.rows[model.item_id] = self.card_wrapper(model)
+        self.items.controls.insert(self.cards.index(model.item_id), row)
+        if len(self.cards) > VIRTUAL_AFTER:
+            self.virtualize()
+
+    def adopt_card(self, model: ItemModel) -> Item | None:
+        # take a card's new record after an update; returns its Item if the
+        # card is rendered
+        self.cards.set(model.item_id, model)
+        item = self.item_view(model.item_id)
+        if item is not None:
+            item.model = model
+        return item
+
+    def release_card(self, item_id: int) -> ft.Column | None:
+        # take a card out of this list, keeping it in the board's label
+        # index; returns its row if it had one
+        if not self.virtual:
+            del self.items.controls[self.cards.index(item_id)]
+        self.cards.remove(item_id)
+        row = self.rows.pop(item_id, None)
+        if self.virtual:
+            self.render_window()
+        return row
+
+    def drop_card(self, item_id: int):
+        self.release_card(item_id)
+        self.board.label_index.remove(item_id)
+
+    def move_card(self, item_id: int, before: int | None):
+        if self.virtual:
+            self.cards.move_before(item_id, before)
+            self.render_window()
+            return
+        row = self.items.controls.pop(self.cards.index(item_id))
+        self.cards.move_before(item_id, before)
+        self.items.controls.insert(self.cards.index(item_id), row)
+
+    def virtualize(self):
+        # from here on only a window of cards has controls; spacers sized
+        # from ROW_HEIGHT keep the scroll extent of the whole list
+        self.virtual = True
+        self.items.scroll = ft.ScrollMode.AUTO
+        self.items.height = VIEWPORT_ROWS * ROW_HEIGHT
+        self.items.on_scroll = self.scroll_cards
+        self.items.on_scroll_interval = 50
+        self.render_window()
+
+    def render_window(self):
+        count = len(self.cards)
+        window = VIEWPORT_ROWS + 2 * OVERSCAN
+        self.first = max(0, min(self.first, count - window))
+        stop = min(count, self.first + window)
+        # rows still in the window keep their controls, so only the cards
+        # that scrolled in are sent to the client
+        self.rows = {
+            id: self.rows[id] if id in self.rows else self.card_wrapper(self.cards.get(id))
+            for id in self.cards.slice(self.first, stop)
+        }
+        self.top_spacer.height = self.first * ROW_HEIGHT
+        self.bottom_spacer.height = (count - stop) * ROW_HEIGHT
+        self.items.controls = [self.top_spacer, *self.rows.values(), self.bottom_spacer]
+
+    def scroll_cards(self, e: ft.OnScrollEvent):
+        first = max(0, int(e.pixels // ROW_HEIGHT) - OVERSCAN)
+        if first != self.first:
+            self.first = first
+            self.render_window()
+            schedule_update(self.page, self.items)
+
+    def apply_change(self, event: ChangeEvent):
+        # a change made by another session; events for cards this view
+        # already shows in place are skipped
+        if event.kind is ChangeKind.ITEM_ADDED:
+            if event.item_id not in self.cards:
+                self.insert_card(event.model, self.known_card(event.before))
+        elif event.kind is ChangeKind.ITEM_UPDATED:
+            if event.item_id in self.cards:
+                # the label index covers every card, rendered or not; only a
+                # rendered card has controls to refresh
+                self.board.label_index.relabel(event.model)
+                item = self.adopt_card(event.model)
+                if item is not None:
+                    item.refresh()
+        elif event.kind is ChangeKind.ITEM_MOVED:
+            before = self.known_card(event.before)
+            if event.item_id in self.cards:
+                if self.cards.next_key(event.item_id) == before:
+                    if event.model is not None:
+                        self.adopt_card(event.model)
+                    return
+                self.drop_card(event.item_id)
+            if event.model is not None:
+                self.insert_card(event.model, before)
+        elif event.kind is ChangeKind.ITEM_REMOVED:
+            if event.item_id in self.cards:
+                self.drop_card(event.item_id)
+
+    def known_card(self, id: int | None):
+        return id if id in self.cards else None
+
+    def refresh_title(self):
+        if isinstance(self.header.controls[0], ft.Text):
+            self.header.controls[0].value = self.title
+        self.inner_list.bgcolor = self.color if (self.color != "") else ft.Colors.BACKGROUND
+
+    async def take_item(self, item: Item, before: int | None = None):
+        # a card dropped here from another list: the store moves its record
+        # and the card keeps its id and its controls
+        source = item.list
+        (moved,) = await self.store.move_items(
+            source.board_list_id, self.board_list_id, [item.item_id], before
+        )
+        row = source.release_card(item.item_id)
+        self.insert_card(moved, before, row)
+        schedule_update(self.page, self.view, source.view)
+
+    async def item_drag_accept(self, e):
         src = self.page.get_control(e.src_id)
-        self.add_item(src.data.item_text, labels=src.data.labels)
-        src.data.list.remove_item(src.data)
+        await self.take_item(src.data)
         self.end_indicator.opacity = 0.0
-        self.update()
+        schedule_update(self.page, self)
 
     def item_will_drag_accept(self, e):
+        # hover feedback is throttled; leave and accept send the final state
         if e.data == "true":
-            self.end_indicator.opacity = 1.0
-        self.update()
+            set_feedback(self.page, self.end_indicator, "opacity", 1.0)
 
     def item_drag_leave(self, e):
         self.end_indicator.opacity = 0.0
-        self.update()
+        schedule_update(self.page, self.end_indicator)
 
-    def list_drag_accept(self, e):
+    async def list_drag_accept(self, e):
         src = self.page.get_control(e.src_id)
-        l = self.board.content.controls
-        to_index = l.index(e.control.data)
-        from_index = l.index(src.content.data)
-        l[to_index], l[from_index] = l[from_index], l[to_index]
+        await self.board.move_list(src.content.data, e.control.data)
         self.inner_list.border = ft.border.all(2, ft.Colors.BLACK12)
-        self.page.update()
+        schedule_update(self.page, self.board.board_lists)
 
     def list_will_drag_accept(self, e):
         if e.data == "true":
-            self.inner_list.border = ft.border.all(2, ft.Colors.BLACK)
-        self.update()
+            set_feedback(
+                self.page, self.inner_list, "border", ft.border.all(2, ft.Colors.BLACK)
+            )
 
     def list_drag_leave(self, e):
         self.inner_list.border = ft.border.all(2, ft.Colors.BLACK12)
-        self.update()
+        schedule_update(self.page, self.inner_list)
 
-    def delete_list(self, e):
-        self.board.remove_list(self, e)
+    async def delete_list(self, e):
+        await self.board.remove_list(self, e)
 
     def edit_title(self, e):
         self.header.controls[0] = self.edit_field
         self.header.controls[1].visible = False
-        self.update()
+        schedule_update(self.page, self)
 
-    def save_title(self, e):
-        self.title = self.edit_field.controls[0].value
+    async def save_title(self, e):
+        self.model = await self.store.update_list(
+            self.model, {"title": self.edit_field.controls[0].value}
+        )
         self.header.controls[0] = ft.Text(
             value=self.title,
             theme_style=ft.TextThemeStyle.TITLE_MEDIUM,
@@ -205,75 +403,95 @@ class BoardList(ft.Container):
             expand=True,
         )
         self.header.controls[1].visible = True
-        self.update()
+        schedule_update(self.page, self)
 
-    def add_item_handler(self, e):
+    async def add_item_handler(self, e):
         if self.new_item_field.value == "":
             return
-        self.add_item()
+        lines = [l.strip() for l in self.new_item_field.value.splitlines() if l.strip()]
+        if len(lines) > 1:
+            await self.add_items(lines)
+        else:
+            await self.add_item()
+
+    async def add_items(self, texts: list[str]):
+        # many cards in one store transaction and one page update
+        new_items = await self.store.add_items(
+            self.board_list_id, [ItemModel(self.board_list_id, text) for text in texts]
+        )
+        for new_item in new_items:
+            self.insert_card(new_item)
+        self.new_item_field.value = ""
+        self.board.remeasure()
+        schedule_update(self.page, self.view)
 
-    def add_item(
+    async def add_item(
         self,
         item: str | None = None,
         chosen_control: ft.Draggable | None = None,
         swap_control: ft.Draggable | None = None,
-        labels: str | None = None
+        labels: list[str] | None = None
     ):
 
-        controls_list = [x.controls[1] for x in self.items.controls]
         to_index = (
-            controls_list.index(swap_control) if swap_control in controls_list else None
+            self.cards.index(swap_control.item_id)
+            if swap_control is not None and swap_control.item_id in self.cards
+            else None
         )
         from_index = (
-            controls_list.index(chosen_control)
-            if chosen_control in controls_list
+            self.cards.index(chosen_control.item_id)
+            if chosen_control is not None and chosen_control.item_id in self.cards
             else None
         )
-        control_to_add = ft.Column(
-            [
-                ft.Container(
-                    bgcolor=ft.Colors.BLACK26,
-                    border_radius=ft.border_radius.all(30),
-                    height=3,
-                    alignment=ft.alignment.center_right,
-                    width=200,
-                    opacity=0.0,
-                )
-            ]
-        )
-
         # rearrange (i.e. drag drop from same list)
         if (from_index is not None) and (to_index is not None):
-            self.items.controls.insert(to_index, self.items.controls.pop(from_index))
+            # pop-then-insert lands after the swap target when moving down
+            before = (
+                self.cards.next_key(swap_control.item_id)
+                if from_index < to_index
+                else swap_control.item_id
+            )
+            self.adopt_card(
+                await self.store.move_item(
+                    self.board_list_id, chosen_control.item_id, before
+                )
+            )
+            self.move_card(chosen_control.item_id, before)
             self.set_indicator_opacity(swap_control, 0.0)
 
         # insert (drag from other list to middle of this list)
         elif to_index is not None:
-            new_item = Item(self, self.store, item, labels=labels)
-            control_to_add.controls.append(new_item)
-            self.items.controls.insert(to_index, control_to_add)
+            new_item = await self.store.add_item(
+                self.board_list_id,
+                ItemModel(self.board_list_id, item, labels=labels),
+                before=swap_control.item_id,
+            )
+            self.insert_card(new_item, before=swap_control.item_id)
 
         # add new (drag from other list to end of this list, or use add item button)
         else:
             new_item = (
-                Item(self, self.store, item, labels=labels)
+                ItemModel(self.board_list_id, item, labels=labels)
                 if item
-                else Item(self, self.store, self.new_item_field.value)
+                else ItemModel(self.board_list_id, self.new_item_field.value)
             )
-            control_to_add.controls.append(new_item)
-            self.items.controls.append(control_to_add)
-            self.store.add_item(self.board_list_id, new_item)
+            new_item = await self.store.add_item(self.board_list_id, new_item)
+            self.insert_card(new_item)
             self.new_item_field.value = ""
 
-        self.page.update()
+        self.board.remeasure()
+        schedule_update(self.page, self.view)
 
-    def remove_item(self, item: Item):
-        controls_list = [x.controls[1] for x in self.items.controls]
-        del self.items.controls[controls_list.index(item)]
-        self.store.remove_item(self.board_list_id, item.item_id)
-        self.view.update()
+    async def remove_item(self, item: Item):
+        await self.store.remove_item(self.board_list_id, item.item_id)
+        self.drop_card(item.item_id)
+        self.board.remeasure()
+        schedule_update(self.page, self.view)
 
-    def set_indicator_opacity(self, item, opacity):
-        controls_list = [x.controls[1] for x in self.items.controls]
-        self.items.controls[controls_list.index(item)].controls[0].opacity = opacity
-        self.view.update()
\ No newline at end of file
+    def set_indicator_opacity(self, item, opacity, feedback: bool = False):
+        indicator = self.rows[item.item_id].controls[0]
+        if feedback:
+            set_feedback(self.page, indicator, "opacity", opacity)
+        elif indicator.opacity != opacity:
+            indicator.opacity = opacity
+            schedule_update(self.page, indicator)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import itertools
+import threading
+from collections import OrderedDict
+from enum import Enum
+
+
+class ChangeKind(Enum):
+    BOARD_ADDED = "board_added"
+    BOARD_UPDATED = "board_updated"
+    BOARD_REMOVED = "board_removed"
+    LIST_ADDED = "list_added"
+    LIST_MOVED = "list_moved"
+    LIST_UPDATED = "list_updated"
+    LIST_REMOVED = "list_removed"
+    ITEM_ADDED = "item_added"
+    ITEM_MOVED = "item_moved"
+    ITEM_UPDATED = "item_updated"
+    ITEM_REMOVED = "item_removed"
+
+
+# who is making the current store call; events carry it so a session's own
+# subscription can skip the changes that session already applied to its views
+change_origin = contextvars.ContextVar("change_origin", default=None)
+
+# only the latest of these matters to a consumer, so a slow subscriber keeps
+# just the newest one per entity
+COALESCED = {
+    ChangeKind.BOARD_UPDATED,
+    ChangeKind.LIST_MOVED,
+    ChangeKind.LIST_UPDATED,
+    ChangeKind.ITEM_MOVED,
+    ChangeKind.ITEM_UPDATED,
+}
+
+
+class ChangeEvent:
+    __slots__ = (
+        "seq",
+        "kind",
+        "board_id",
+        "list_id",
+        "item_id",
+        "before",
+        "from_list",
+        "model",
+        "origin",
+    )
+
+    def __init__(
+        self,
+        kind: ChangeKind,
+        board_id: int | None = None,
+        list_id: int | None = None,
+        item_id: int | None = None,
+        before: int | None = None,
+        from_list: int | None = None,
+        model=None,
+    ):
+        self.seq = 0
+        self.kind = kind
+        self.board_id = board_id
+        self.list_id = list_id
+        self.item_id = item_id
+        # id of the list or item the entity now sits in front of, for added
+        # and moved events; None means last
+        self.before = before
+        self.from_list = from_list
+        self.model = model
+        self.origin = change_origin.get()
+
+    def entity(self):
+        if self.item_id is not None:
+            return ("item", self.item_id)
+        if self.list_id is not None:
+            return ("list", self.list_id)
+        return ("board", self.board_id)
+
+    def __repr__(self):
+        return f"ChangeEvent({self.seq}, {self.kind.value}, {self.entity()})"
+
+
+class Subscription:
+    # Bounded per-subscriber queue. Updates and moves of the same entity are
+    # coalesced; if the queue still overflows it is dropped and the consumer
+    # is told to resync from the store.
+
+    def __init__(
+        self, feed: "ChangeFeed", board_id: int | None, max_pending: int, origin=None
+    ):
+        self.feed = feed
+        self.board_id = board_id
+        self.origin = origin
+        self.max_pending = max_pending
+        self.pending: OrderedDict = OrderedDict()
+        self.overflowed = False
+        self.closed = False
+        self.last_seq = 0
+        self.lock = threading.Lock()
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self.ready = asyncio.Event() if self.loop is not None else None
+
+    def push(self, event: ChangeEvent):
+        if self.board_id is not None and event.board_id != self.board_id:
+            return
+        if self.origin is not None and event.origin is self.origin:
+            return
+        with self.lock:
+            if self.overflowed:
+                return
+            if event.kind in COALESCED:
+                key = (event.kind, event.entity())
+                previous = self.pending.pop(key, None)
+                if previous is not None and event.kind is ChangeKind.ITEM_MOVED:
+                    event = self.merge_move(previous, event)
+            else:
+                key = event.seq
+            self.pending[key] = event
+            if len(self.pending) > self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+    def merge_move(self, previous: ChangeEvent, event: ChangeEvent) -> ChangeEvent:
+        # the consumer still holds the card where the first move found it
+        merged = ChangeEvent(
+            event.kind,
+            event.board_id,
+            event.list_id,
+            event.item_id,
+            event.before,
+            previous.from_list,
+            event.model,
+        )
+        merged.seq = event.seq
+        merged.origin = event.origin
+        return merged
+
+    def drain(self) -> list[ChangeEvent] | None:
+        # pending events in sequence order, or None when the consumer fell
+        # too far behind and has to reload
+        with self.lock:
+            if self.overflowed:
+                self.overflowed = False
+                return None
+            events = list(self.pending.values())
+            self.pending.clear()
+        if events:
+            self.last_seq = events[-1].seq
+        return events
+
+    async def next_batch(self) -> list[ChangeEvent] | None:
+        while True:
+            self.ready.clear()
+            events = self.drain()
+            if events is None or events or self.closed:
+                return events
+            await self.ready.wait()
+
+    def close(self):
+        self.feed.unsubscribe(self)
+        self.closed = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.ready.set)
+
+
+class ChangeFeed:
+
+    def __init__(self):
+        self.seq = itertools.count(1)
+        self.lock = threading.Lock()
+        self.subscriptions: list[Subscription] = []
+        # called synchronously from publish, for indexes that must never lag
+        # behind the store
+        self.listeners: list = []
+
+    def listen(self, listener):
+        with self.lock:
+            self.listeners = self.listeners + [listener]
+
+    def unlisten(self, listener):
+        with self.lock:
+            self.listeners = [l for l in self.listeners if l is not listener]
+
+    def subscribe(
+        self, board_id: int | None = None, max_pending: int = 256, origin=None
+    ):
+        subscription = Subscription(self, board_id, max_pending, origin)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+
+    def publish(self, events: list[ChangeEvent]):
+        with self.lock:
+            for event in events:
+                event.seq = next(self.seq)
+            subscriptions = self.subscriptions
+            listeners = self.listeners
+        for listener in listeners:
+            listener(events)
+        for subscription in subscriptions:
+            for event in events:
+                subscription.push(event)
@@ -1,24 +1,43 @@
+from contextlib import nullcontext
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from board import Board
-    from board_list import BoardList
+    from change_feed import Subscription
+    from models import BoardModel, BoardListModel, ItemModel
+    from search_index import SearchHit
     from user import User
-    from item import Item
 
 
 class DataStore:
 
-    def add_board(self, model) -> None:
+    def transaction(self):
+        return nullcontext()
+
+    def snapshot(self) -> "DataStore":
+        # a consistent read-only view for a group of reads; stores without
+        # snapshots answer reads directly
+        return self
+
+    def subscribe(self, board_id=None, max_pending=256, origin=None) -> "Subscription":
+        raise NotImplementedError
+
+    def search(self, query, limit=20) -> list["SearchHit"]:
+        raise NotImplementedError
+
+    def add_board(self, model) -> "BoardModel":
+        # add_* return the stored records, whose ids the store may assign;
+        # the id a new model was built with is only a placeholder
         raise NotImplementedError
 
-    def get_board(self, id) -> "Board":
+    def get_board(self, id) -> "BoardModel":
         raise NotImplementedError
 
-    def get_boards(self) -> list["Board"]:
+    def get_boards(self) -> list["BoardModel"]:
         raise NotImplementedError
 
-    def update_board(self, model, update):
+    def update_board(self, model, update) -> "BoardModel":
+        # update_*, move_item and move_items return the stored records after
+        # the change; callers keep those in place of the ones they passed
         raise NotImplementedError
 
     def remove_board(self, board) -> None:
@@ -36,32 +55,56 @@ class DataStore:
     def remove_user(self, id) -> None:
         raise NotImplementedError
 
-    def add_list(self, board, model) -> None:
+    def add_list(self, board, model, before=None) -> "BoardListModel":
         raise NotImplementedError
 
-    def get_lists(self) -> list["BoardList"]:
+    def get_lists(self) -> list["BoardListModel"]:
         raise NotImplementedError
 
-    def get_list(self, id) -> "BoardList":
+    def get_list(self, id) -> "BoardListModel":
         raise NotImplementedError
 
-    def get_lists_by_board(self, board) -> list["BoardList"]:
+    def get_lists_by_board(self, board) -> list["BoardListModel"]:
+        raise NotImplementedError
+
+    def update_list(self, model, update) -> "BoardListModel":
+        raise NotImplementedError
+
+    def move_list(self, board, id, before=None) -> None:
         raise NotImplementedError
 
     def remove_list(self, board, id) -> None:
         raise NotImplementedError
 
-    def add_item(self, board_list, model) -> None:
+    def add_item(self, board_list, model, before=None) -> "ItemModel":
+        raise NotImplementedError
+
+    def get_items(self, board_list) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    def get_item(self, id) -> "ItemModel":
         raise NotImplementedError
 
-    def get_items(self, board_list) -> list["Item"]:
+    def get_items_by_board(self, board) -> list["ItemModel"]:
         raise NotImplementedError
 
-    def get_item(self, id) -> "Item":
+    def update_item(self, model, update) -> "ItemModel":
         raise NotImplementedError
 
-    def get_items_by_board(self, board) -> list["Item"]:
+    def move_item(self, board_list, id, before=None) -> "ItemModel":
         raise NotImplementedError
 
     def remove_item(self, board_list, id) -> None:
+        raise NotImplementedError
+
+    def add_items(self, board_list, models, before=None) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    def move_items(self, src_list, dst_list, ids, before=None) -> list["ItemModel"]:
+        raise NotImplementedError
+
+    def remove_items(self, board_list, ids) -> None:
+        raise NotImplementedError
+
+    def bulk_update_labels(self, ids, add=(), remove=()) -> None:
         raise NotImplementedError
\ No newline at end of file
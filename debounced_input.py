@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from typing import Callable
+
+import flet as ft
+
+
+class DebouncedInput:
+    # on_change handler for text fields. Keystrokes only record the value;
+    # once the field has been quiet for QUIET seconds the value is turned
+    # into derived state (say, whether a button is enabled) and apply runs
+    # if that state differs from what was last applied. Typing a word costs
+    # at most one update instead of one per character. Flet calls sync
+    # handlers on its executor, so the timer is armed on the page's loop.
+
+    QUIET = 0.15
+
+    def __init__(
+        self,
+        page: ft.Page,
+        derive: Callable[[str], object],
+        apply: Callable[[object], None],
+        initial=None,
+    ):
+        self.page = page
+        self.derive = derive
+        self.apply = apply
+        self.state = initial
+        self.value = ""
+        self.lock = threading.Lock()
+        self.timer: asyncio.TimerHandle | None = None
+
+    def __call__(self, e: ft.ControlEvent):
+        with self.lock:
+            self.value = e.control.value or ""
+        self.page.loop.call_soon_threadsafe(self.arm)
+
+    def arm(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.page.loop.call_later(self.QUIET, self.settle)
+
+    def settle(self):
+        self.timer = None
+        with self.lock:
+            value = self.value
+        state = self.derive(value)
+        if state != self.state:
+            self.state = state
+            self.apply(state)
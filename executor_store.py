@@ -0,0 +1,135 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from async_data_store import AsyncDataStore
+from change_feed import change_origin
+from data_store import DataStore
+
+
+class ExecutorStore(AsyncDataStore):
+    # Runs a synchronous DataStore on worker threads, so slow backends never
+    # block the event loop. Sessions sharing a store may share the executor
+    # too; the store's own lock serializes their writes.
+
+    def __init__(self, store: DataStore, executor: ThreadPoolExecutor | None = None):
+        self.store = store
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="store"
+        )
+
+    async def call(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self.run_as_origin, fn, *args)
+        )
+
+    def run_as_origin(self, fn: Callable, *args):
+        # changes made by this call are tagged with this store, which is the
+        # origin its own subscription filters out
+        token = change_origin.set(self)
+        try:
+            return fn(*args)
+        finally:
+            change_origin.reset(token)
+
+    async def batch(self, fn: Callable[[DataStore], object]):
+        def run():
+            with self.store.transaction():
+                return fn(self.store)
+
+        return await self.call(run)
+
+    async def read(self, fn: Callable[[DataStore], object]):
+        # several reads against one snapshot, without the writer's transaction
+        return await self.call(lambda: fn(self.store.snapshot()))
+
+    async def subscribe(self, board_id=None, max_pending=256):
+        # called on the event loop so the subscription can wake it from the
+        # store's worker thread
+        return self.store.subscribe(board_id, max_pending, origin=self)
+
+    async def search(self, query, limit=20):
+        return await self.call(self.store.search, query, limit)
+
+    async def add_board(self, model):
+        return await self.call(self.store.add_board, model)
+
+    async def get_board(self, id):
+        return await self.call(self.store.get_board, id)
+
+    async def get_boards(self):
+        return await self.call(self.store.get_boards)
+
+    async def update_board(self, model, update):
+        return await self.call(self.store.update_board, model, update)
+
+    async def remove_board(self, board):
+        return await self.call(self.store.remove_board, board)
+
+    async def add_user(self, model):
+        return await self.call(self.store.add_user, model)
+
+    async def get_users(self):
+        return await self.call(self.store.get_users)
+
+    async def get_user(self, id):
+        return await self.call(self.store.get_user, id)
+
+    async def remove_user(self, id):
+        return await self.call(self.store.remove_user, id)
+
+    async def add_list(self, board, model, before=None):
+        return await self.call(self.store.add_list, board, model, before)
+
+    async def get_lists(self):
+        return await self.call(self.store.get_lists)
+
+    async def get_list(self, id):
+        return await self.call(self.store.get_list, id)
+
+    async def get_lists_by_board(self, board):
+        return await self.call(self.store.get_lists_by_board, board)
+
+    async def update_list(self, model, update):
+        return await self.call(self.store.update_list, model, update)
+
+    async def move_list(self, board, id, before=None):
+        return await self.call(self.store.move_list, board, id, before)
+
+    async def remove_list(self, board, id):
+        return await self.call(self.store.remove_list, board, id)
+
+    async def add_item(self, board_list, model, before=None):
+        return await self.call(self.store.add_item, board_list, model, before)
+
+    async def get_items(self, board_list):
+        return await self.call(self.store.get_items, board_list)
+
+    async def get_item(self, id):
+        return await self.call(self.store.get_item, id)
+
+    async def get_items_by_board(self, board):
+        return await self.call(self.store.get_items_by_board, board)
+
+    async def update_item(self, model, update):
+        return await self.call(self.store.update_item, model, update)
+
+    async def move_item(self, board_list, id, before=None):
+        return await self.call(self.store.move_item, board_list, id, before)
+
+    async def remove_item(self, board_list, id):
+        return await self.call(self.store.remove_item, board_list, id)
+
+    async def add_items(self, board_list, models, before=None):
+        return await self.call(self.store.add_items, board_list, models, before)
+
+    async def move_items(self, src_list, dst_list, ids, before=None):
+        return await self.call(self.store.move_items, src_list, dst_list, ids, before)
+
+    async def remove_items(self, board_list, ids):
+        return await self.call(self.store.remove_items, board_list, ids)
+
+    async def bulk_update_labels(self, ids, add=(), remove=()):
+        return await self.call(self.store.bulk_update_labels, ids, add, remove)
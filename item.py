@@ -2,20 +2,18 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from board_list import BoardList
-import itertools
 import flet as ft
-from data_store import DataStore
+from async_data_store import AsyncDataStore
+from models import ItemModel
+from update_scheduler import schedule_update, set_feedback
 
 
 class Item(ft.Container):
-    id_counter = itertools.count()
 
-    def __init__(self, list: "BoardList", store: DataStore, item_text: str, labels: list[str] = None):
-        self.item_id = next(Item.id_counter)
-        self.store: DataStore = store
+    def __init__(self, list: "BoardList", store: AsyncDataStore, model: ItemModel):
+        self.model = model
+        self.store: AsyncDataStore = store
         self.list = list
-        self.item_text = item_text
-        self.labels = labels if labels else []
 
         self.menu_button = ft.PopupMenuButton(
             items=[
@@ -78,15 +76,47 @@ class Item(ft.Container):
         )
         super().__init__(content=self.view)
 
+    @property
+    def item_id(self):
+        return self.model.item_id
+
+    @property
+    def item_text(self):
+        return self.model.item_text
+
+    @property
+    def labels(self):
+        return self.model.labels
+
+    def refresh(self):
+        # re-render from the record after another session edited it
+        checkbox = self.card_item.content.controls[0].controls[0].content
+        if isinstance(checkbox, ft.Checkbox):
+            checkbox.label = f"{self.item_text}"
+        self.render_labels()
+
+    def render_labels(self):
+        self.card_item.content.controls[1].controls = [
+            ft.Text(label, bgcolor=ft.Colors.LIGHT_BLUE)
+            for label in self.labels
+        ]
+        self.list.board.label_index.relabel(self.model)
+
     def manage_labels(self, e):
-        def close_dlg(e):
-            self.labels = [label_field.value]
-            self.card_item.content.controls[1].controls = [
-                ft.Text(label, bgcolor=ft.Colors.LIGHT_BLUE)
-                for label in self.labels
-            ]
-            self.page.close(dialog)
-            self.page.update()
+        # the card may scroll out of the list's window while the dialog is
+        # open, which unmounts this Item; the app's page stays
+        page = self.list.board.app.page
+
+        async def close_dlg(e):
+            item = await self.store.update_item(
+                self.model, {"labels": [label_field.value]}
+            )
+            # adopt_card only reaches this Item while its row is in the window
+            self.list.adopt_card(item)
+            self.model = item
+            self.render_labels()
+            page.close(dialog)
+            schedule_update(page, self.card_item)
 
         label_field = ft.TextField(value=self.labels[0] if self.labels else "", hint_text="Add or edit label")
 
@@ -97,58 +127,60 @@ class Item(ft.Container):
                 tight=True,
             ),
         )
-        self.page.open(dialog)
+        page.open(dialog)
 
-    def drag_accept(self, e):
+    async def drag_accept(self, e):
         src = self.page.get_control(e.src_id)
 
         # skip if item is dropped on itself
         if src.content.content == e.control.content:
             self.card_item.elevation = 1
             self.list.set_indicator_opacity(self, 0.0)
-            e.control.update()
+            schedule_update(self.page, e.control)
             return
 
         # item dropped within same list but not on self
         if src.data.list == self.list:
-            self.list.add_item(chosen_control=src.data, swap_control=self)
+            await self.list.add_item(chosen_control=src.data, swap_control=self)
             self.card_item.elevation = 1
-            e.control.update()
+            schedule_update(self.page, e.control)
             return
 
-        # item added to different list
-        new_item = Item(self.list, self.store, src.data.item_text, labels=src.data.labels)
-        self.list.add_item(new_item)
-        # remove from the list to which draggable belongs
-        src.data.list.remove_item(src.data)
+        # item moved from a different list to just above this one
+        await self.list.take_item(src.data, before=self.item_id)
         self.list.set_indicator_opacity(self, 0.0)
         self.card_item.elevation = 1
-        self.page.update()
+        schedule_update(self.page, self.card_item)
 
     def drag_will_accept(self, e):
-        if e.data == "true":
-            self.list.set_indicator_opacity(self, 1.0)
-        self.card_item.elevation = 20 if e.data == "true" else 1
-        self.page.update()
+        # hover feedback is throttled and repeats are dropped; leave and
+        # accept send the final state
+        hovering = e.data == "true"
+        if hovering:
+            self.list.set_indicator_opacity(self, 1.0, feedback=True)
+        set_feedback(self.page, self.card_item, "elevation", 20 if hovering else 1)
 
     def drag_leave(self, e):
         self.list.set_indicator_opacity(self, 0.0)
         self.card_item.elevation = 1
-        self.page.update()
+        schedule_update(self.page, self.card_item)
     
     def edit_item(self, e):
         self.card_item.content.controls[0].controls[0].content = ft.TextField(
             value=self.item_text,
             on_submit=self.save_item,
         )
-        self.page.update()
+        schedule_update(self.page, self.card_item)
     
-    def save_item(self, e):
-        self.item_text = e.control.value
+    async def save_item(self, e):
+        item = await self.store.update_item(self.model, {"item_text": e.control.value})
+        # as in manage_labels, the row may have left the window meanwhile
+        self.list.adopt_card(item)
+        self.model = item
         self.card_item.content.controls[0].controls[0].content = ft.Checkbox(
             label=f"{self.item_text}", width=200
         )
-        self.page.update()
+        schedule_update(self.list.board.app.page, self.card_item)
     
-    def delete_item(self, e):
-        self.list.remove_item(self)
\ No newline at end of file
+    async def delete_item(self, e):
+        await self.list.remove_item(self)
\ No newline at end of file
@@ -0,0 +1,223 @@
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+SNAPSHOT = "snapshot"
+
+
+def empty_state() -> dict:
+    return {"boards": {}, "users": {}, "lists": {}, "items": {}}
+
+
+def apply(state: dict, op: tuple):
+    # replays one journaled mutation onto plain field dicts keyed by the
+    # model attribute names InMemoryStore journals them under
+    kind, *args = op
+    if kind == "add_board":
+        id, name = args
+        state["boards"][id] = {"name": name}
+    elif kind == "update_board":
+        id, update = args
+        state["boards"][id].update(update)
+    elif kind == "remove_board":
+        (id,) = args
+        state["boards"].pop(id, None)
+        lists = {l for l, v in state["lists"].items() if v["board"] == id}
+        state["lists"] = {l: v for l, v in state["lists"].items() if l not in lists}
+        state["items"] = {
+            i: v for i, v in state["items"].items() if v["list"] not in lists
+        }
+    elif kind == "add_user":
+        user, password = args
+        state["users"][user] = password
+    elif kind == "remove_user":
+        (user,) = args
+        state["users"].pop(user, None)
+    elif kind == "add_list":
+        board, id, title, color, position = args
+        state["lists"][id] = {
+            "board": board,
+            "title": title,
+            "color": color,
+            "position": position,
+        }
+    elif kind in ("update_list", "move_list"):
+        id, update = args
+        state["lists"][id].update(update)
+    elif kind == "remove_list":
+        (id,) = args
+        state["lists"].pop(id, None)
+        state["items"] = {i: v for i, v in state["items"].items() if v["list"] != id}
+    elif kind == "add_item":
+        board_list, id, item_text, labels, position = args
+        state["items"][id] = {
+            "list": board_list,
+            "item_text": item_text,
+            "labels": labels,
+            "position": position,
+        }
+    elif kind in ("update_item", "move_item"):
+        id, update = args
+        state["items"][id].update(update)
+    elif kind == "remove_item":
+        (id,) = args
+        state["items"].pop(id, None)
+    elif kind == "batch":
+        # one framed record per store transaction, so it replays all or nothing
+        (ops,) = args
+        for op in ops:
+            apply(state, op)
+    else:
+        raise ValueError(f"unknown journal op: {kind!r}")
+
+
+def read_segment(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, crc = HEADER.unpack_from(data, offset)
+        payload = data[offset + HEADER.size : offset + HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            # torn write at the tail of the last segment
+            return
+        yield pickle.loads(payload)
+        offset += HEADER.size + length
+
+
+class Journal:
+    # Append-only operation log for InMemoryStore. Records are length- and
+    # crc-framed pickles, fsynced in groups by a background thread every
+    # sync_interval seconds. Once the open segment passes compact_bytes it is
+    # sealed and a background thread folds the sealed segments into the
+    # snapshot, so recovery replays at most one snapshot plus a short tail.
+
+    def __init__(
+        self,
+        directory: str,
+        sync_interval: float = 0.05,
+        compact_bytes: int = 4 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self.lock = threading.Lock()
+        self.compacting: threading.Thread | None = None
+        self.dirty = False
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+
+        self.recovered = self.recover()
+        segments = self.segments()
+        self.generation = (segments[-1] + 1) if segments else self.snapshot_generation()
+        self.file = open(self.segment_path(self.generation), "ab")
+
+        self.wakeup = threading.Event()
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def segment_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"segment-{generation:08d}.log")
+
+    def segments(self) -> list[int]:
+        return sorted(
+            int(name[8:-4])
+            for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".log")
+        )
+
+    def load_snapshot(self) -> tuple[int, dict]:
+        path = os.path.join(self.directory, SNAPSHOT)
+        if not os.path.exists(path):
+            return 0, empty_state()
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        return snapshot["generation"], snapshot["state"]
+
+    def snapshot_generation(self) -> int:
+        return self.load_snapshot()[0]
+
+    def replay(self, state: dict, first: int, last: int | None = None) -> dict:
+        for generation in self.segments():
+            if generation < first or (last is not None and generation > last):
+                continue
+            for op in read_segment(self.segment_path(generation)):
+                apply(state, op)
+        return state
+
+    def recover(self) -> dict:
+        generation, state = self.load_snapshot()
+        return self.replay(state, generation)
+
+    def append(self, op: tuple):
+        payload = pickle.dumps(op, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.file.write(payload)
+            self.dirty = True
+            if self.file.tell() >= self.compact_bytes and self.compacting is None:
+                self.rotate()
+        self.wakeup.set()
+
+    def sync(self):
+        with self.lock:
+            if self.dirty:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.dirty = False
+
+    def flush_loop(self):
+        while not self.closed:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # let a burst of appends pile up behind one fsync
+            time.sleep(self.sync_interval)
+            self.sync()
+
+    def rotate(self):
+        # called with self.lock held
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+        self.file.close()
+        sealed = self.generation
+        self.generation += 1
+        self.file = open(self.segment_path(self.generation), "ab")
+        self.compacting = threading.Thread(
+            target=self.compact, args=(sealed,), daemon=True
+        )
+        self.compacting.start()
+
+    def compact(self, sealed: int):
+        try:
+            generation, state = self.load_snapshot()
+            self.replay(state, generation, sealed)
+            path = os.path.join(self.directory, SNAPSHOT)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(
+                    {"generation": sealed + 1, "state": state},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            for generation in self.segments():
+                if generation <= sealed:
+                    os.remove(self.segment_path(generation))
+        finally:
+            self.compacting = None
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+        self.flusher.join()
+        compacting = self.compacting
+        if compacting is not None:
+            compacting.join()
+        self.sync()
+        self.file.close()
@@ -0,0 +1,104 @@
+from models import LABELS, ItemModel
+
+
+class LabelIndex:
+    # Per-board label id -> bitset of the cards carrying it. Cards get dense
+    # ordinals (freed ordinals are reused), so each bitset is a plain int and
+    # a filter is a handful of ORs instead of a scan over every card.
+
+    def __init__(self):
+        self.ordinals: dict[int, int] = {}
+        self.models: list[ItemModel | None] = []
+        self.free: list[int] = []
+        self.labels: dict[int, frozenset[int]] = {}
+        self.bits: dict[int, int] = {}
+        # label id -> number of cards carrying it; labels leave the catalog
+        # when their last card does
+        self.counts: dict[int, int] = {}
+        # every indexed card, and the ones the current filter shows
+        self.all = 0
+        self.visible = 0
+
+    def add(self, model: ItemModel):
+        if model.item_id in self.ordinals:
+            self.relabel(model)
+            return
+        if self.free:
+            ordinal = self.free.pop()
+            self.models[ordinal] = model
+        else:
+            ordinal = len(self.models)
+            self.models.append(model)
+        self.ordinals[model.item_id] = ordinal
+        bit = 1 << ordinal
+        self.all |= bit
+        # new cards show up whatever the filter, as they always have
+        self.visible |= bit
+        self.labels[model.item_id] = frozenset()
+        self.relabel(model)
+
+    def remove(self, item_id: int):
+        ordinal = self.ordinals.pop(item_id, None)
+        if ordinal is None:
+            return
+        mask = ~(1 << ordinal)
+        for label in self.labels.pop(item_id):
+            self.clear(label, mask)
+        self.all &= mask
+        self.visible &= mask
+        self.models[ordinal] = None
+        self.free.append(ordinal)
+
+    def relabel(self, model: ItemModel):
+        ordinal = self.ordinals.get(model.item_id)
+        if ordinal is None:
+            return
+        old = self.labels[model.item_id]
+        self.models[ordinal] = model
+        new = frozenset(model.label_ids)
+        bit = 1 << ordinal
+        for label in old - new:
+            self.clear(label, ~bit)
+        for label in new - old:
+            self.bits[label] = self.bits.get(label, 0) | bit
+            self.counts[label] = self.counts.get(label, 0) + 1
+        self.labels[model.item_id] = new
+
+    def clear(self, label: int, mask: int):
+        bits = self.bits[label] & mask
+        if bits:
+            self.bits[label] = bits
+            self.counts[label] -= 1
+        else:
+            del self.bits[label]
+            del self.counts[label]
+
+    def is_visible(self, item_id: int) -> bool:
+        ordinal = self.ordinals.get(item_id)
+        return ordinal is None or bool(self.visible >> ordinal & 1)
+
+    def match(self, labels: list[str]) -> int:
+        # cards carrying any of the labels; no labels means every card
+        if not labels:
+            return self.all
+        bits = 0
+        for label in labels:
+            bits |= self.bits.get(LABELS.lookup(label), 0)
+        return bits
+
+    def catalog(self) -> dict[str, int]:
+        return {LABELS.names[id]: count for id, count in self.counts.items()}
+
+    def filter(self, labels: list[str]) -> tuple[list[ItemModel], list[ItemModel]]:
+        # (cards to show, cards to hide) for the new filter; cards whose
+        # visibility does not change are left out
+        visible = self.match(labels)
+        changed = visible ^ self.visible
+        self.visible = visible
+        shown, hidden = [], []
+        while changed:
+            low = changed & -changed
+            model = self.models[low.bit_length() - 1]
+            (shown if visible & low else hidden).append(model)
+            changed ^= low
+        return shown, hidden
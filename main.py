@@ -1,19 +1,36 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 import flet as ft
 from app_layout import AppLayout
 from board import Board
+from change_feed import ChangeEvent, ChangeKind, Subscription
 from user import User
+from async_data_store import AsyncDataStore
 from data_store import DataStore
+from debounced_input import DebouncedInput
+from executor_store import ExecutorStore
+from journal import Journal
 from memory_store import InMemoryStore
+from models import BoardModel
+from sqlite_store import SqliteStore
 from user import User
+from view_cache import ViewCache
+from update_scheduler import schedule_update
 
 
 class TrelloApp(AppLayout):
-    def __init__(self, page: ft.Page, store: DataStore):
+    def __init__(self, page: ft.Page, store: AsyncDataStore):
         self.page: ft.Page = page
-        self.store: DataStore = store
+        self.store: AsyncDataStore = store
         self.user: str | None = None
+        self.changes = None
         self.page.on_route_change = self.route_change
-        self.boards = self.store.get_boards()
+        # a web client that drops its connection may never come back, so its
+        # subscription stops queueing changes until it does
+        self.page.on_close = self.close_changes
+        self.page.on_disconnect = self.close_changes
+        self.page.on_connect = self.resume_changes
         self.login_profile_button = ft.PopupMenuItem(text="Log in", on_click=self.login)
         self.settings = ft.PopupMenuItem(text="Settings", on_click=self.settings_popup)
         self.appbar_items = [
@@ -47,12 +64,13 @@ class TrelloApp(AppLayout):
             self,
             self.page,
             self.store,
+            board_cache=create_board_cache(),
             tight=True,
             expand=True,
             vertical_alignment=ft.CrossAxisAlignment.START,
         )
 
-    def initialize(self):
+    async def initialize(self):
         self.page.views.append(
             ft.View(
                 "/",
@@ -62,22 +80,91 @@ class TrelloApp(AppLayout):
             )
         )
         self.page.update()
+        # subscribe before loading so no change between the two is missed
+        self.changes = await self.store.subscribe()
+        boards = await self.load_boards()
         # create an initial board for demonstration if no boards
-        if len(self.boards) == 0:
-            self.create_new_board("My First Board")
+        if len(boards) == 0:
+            await self.create_new_board("My First Board")
+        await self.hydrate_all_boards_view()
+        self.page.run_task(self.follow_changes, self.changes)
         self.page.go("/")
 
+    async def load_boards(self):
+        # only the records; boards build their views when they are opened
+        boards = await self.store.get_boards()
+        self.boards = {b.board_id: b for b in boards}
+        self.board_views.clear()
+        return boards
+
+    async def follow_changes(self, changes: Subscription):
+        # apply changes other sessions make to the store, one page update per
+        # batch; a subscriber that fell behind reloads its boards instead
+        while not changes.closed:
+            events = await changes.next_batch()
+            if events is None:
+                await self.reload_boards()
+            else:
+                for event in events:
+                    await self.apply_change(event)
+                for board_id in {event.board_id for event in events}:
+                    self.board_views.touch(board_id)
+            schedule_update(self.page, self)
+
+    async def reload_boards(self):
+        active = self.active_view
+        await self.load_boards()
+        if isinstance(active, Board):
+            if active.board_id in self.boards:
+                self.active_view = await self.open_board(self.boards[active.board_id])
+            else:
+                await self.set_all_boards_view()
+                return
+        await self.hydrate_all_boards_view()
+
+    async def apply_change(self, event: ChangeEvent):
+        # board changes touch only that board's tile and rail destination
+        if event.kind is ChangeKind.BOARD_ADDED:
+            if event.board_id not in self.boards:
+                self.board_added(event.model)
+        elif event.kind is ChangeKind.BOARD_UPDATED:
+            if event.board_id in self.boards:
+                self.board_updated(event.model)
+        elif event.kind is ChangeKind.BOARD_REMOVED:
+            active = self.board_views.peek(event.board_id) is self.active_view
+            self.board_removed(event.board_id)
+            if active:
+                await self.set_all_boards_view()
+        elif event.board_id in self.board_views:
+            self.board_views.peek(event.board_id).apply_change(event)
+        elif event.board_id in self.pending_changes:
+            self.pending_changes[event.board_id].append(event)
+
+    def close_changes(self, e):
+        if self.changes is not None:
+            self.changes.close()
+            self.changes = None
+
+    async def resume_changes(self, e):
+        # whatever changed while the client was away is only in the store
+        if self.changes is not None:
+            return
+        self.changes = await self.store.subscribe()
+        await self.reload_boards()
+        self.page.run_task(self.follow_changes, self.changes)
+        schedule_update(self.page, self)
+
     def login(self, e):
-        def close_dlg(e):
+        async def close_dlg(e):
             if user_name.value == "" or password.value == "":
                 user_name.error_text = "Please provide username"
                 password.error_text = "Please provide password"
-                self.page.update()
+                schedule_update(self.page, user_name, password)
                 return
             else:
                 user = User(user_name.value, password.value)
-                if user not in self.store.get_users():
-                    self.store.add_user(user)
+                if user not in await self.store.get_users():
+                    await self.store.add_user(user)
                 self.user = user_name.value
                 self.page.client_storage.set("current_user", user_name.value)
 
@@ -85,7 +172,7 @@ class TrelloApp(AppLayout):
             self.appbar_items[0] = ft.PopupMenuItem(
                 text=f"{self.page.client_storage.get('current_user')}'s Profile"
             )
-            self.page.update()
+            schedule_update(self.page, self.appbar)
 
         user_name = ft.TextField(label="User name")
         password = ft.TextField(label="Password", password=True)
@@ -105,7 +192,6 @@ class TrelloApp(AppLayout):
     def settings_popup(self, _):
         def close_dlg(_):
             self.page.close(dialog)
-            self.page.update()
 
         def toggle_dark_mode(_):
             if self.page.theme_mode == ft.ThemeMode.LIGHT:
@@ -118,7 +204,8 @@ class TrelloApp(AppLayout):
                 self.appbar.bgcolor = "#778da9"
                 self.page.bgcolor = "#e0e1dd"
                 dark_mode_toggle.label = "Dark Mode"
-            self.page.update()
+            # theme and background are page properties
+            schedule_update(self.page)
 
         dark_mode_toggle = ft.Switch(
             label="Light Mode" if self.page.theme_mode == ft.ThemeMode.DARK else "Dark Mode",
@@ -139,37 +226,41 @@ class TrelloApp(AppLayout):
         self.page.open(dialog)
         
 
-    def route_change(self, e):
+    async def route_change(self, e):
         troute = ft.TemplateRoute(self.page.route)
         if troute.match("/"):
             self.page.go("/boards")
         elif troute.match("/board/:id"):
-            if int(troute.id) > len(self.store.get_boards()):
-                self.page.go("/")
+            # ids are stable, so links survive other boards being added or
+            # removed; one that is malformed or names a deleted board goes
+            # back to the boards list
+            board_id = int(troute.id) if troute.id.isdigit() else None
+            if board_id not in self.boards:
+                self.page.go("/boards")
                 return
-            self.set_board_view(int(troute.id))
+            await self.set_board_view(board_id)
         elif troute.match("/boards"):
-            self.set_all_boards_view()
+            await self.set_all_boards_view()
         elif troute.match("/members"):
-            self.set_members_view()
-        self.page.update()
+            await self.set_members_view()
 
     def add_board(self, e):
-        def close_dlg(e):
-            if (hasattr(e.control, "text") and not e.control.text == "Cancel") or (
-                type(e.control) is ft.TextField and e.control.value != ""
-            ):
-                self.create_new_board(dialog_text.value)
+        async def close_dlg(e):
+            # the Create button's state trails typing by DebouncedInput.QUIET,
+            # so the name itself is checked here
+            named = bool((dialog_text.value or "").strip())
+            if named and getattr(e.control, "text", None) != "Cancel":
+                await self.create_new_board(dialog_text.value)
             self.page.close(dialog)
-            self.page.update()
+            schedule_update(self.page, self)
 
-        def textfield_change(e):
-            if dialog_text.value == "":
-                create_button.disabled = True
-            else:
-                create_button.disabled = False
-            self.page.update()
+        def set_can_create(can_create):
+            create_button.disabled = not can_create
+            schedule_update(self.page, create_button)
 
+        textfield_change = DebouncedInput(
+            self.page, lambda name: bool(name.strip()), set_can_create, initial=False
+        )
         dialog_text = ft.TextField(
             label="New Board Name", on_submit=close_dlg, on_change=textfield_change
         )
@@ -193,21 +284,53 @@ class TrelloApp(AppLayout):
             ),
         )
         self.page.open(dialog)
-        dialog.open = True
-        self.page.update()
         dialog_text.focus()
 
-    def create_new_board(self, board_name):
-        new_board = Board(self, self.store, board_name, self.page)
-        self.store.add_board(new_board)
-        self.hydrate_all_boards_view()
+    async def create_new_board(self, board_name):
+        model = await self.store.add_board(BoardModel(board_name))
+        self.board_added(model)
+        schedule_update(self.page, self)
+
+    async def delete_board(self, e):
+        await self.store.remove_board(e.control.data)
+        self.board_removed(e.control.data.board_id)
+        schedule_update(self.page, self)
+
+
+def create_store() -> DataStore:
+    # KANBAN_DB selects the SQLite backend, KANBAN_JOURNAL a journaled
+    # in-memory store; without either, data lives only as long as the process
+    if os.getenv("KANBAN_DB"):
+        return SqliteStore(os.getenv("KANBAN_DB"))
+    if os.getenv("KANBAN_JOURNAL"):
+        return InMemoryStore(journal=Journal(os.getenv("KANBAN_JOURNAL")))
+    return InMemoryStore()
+
+
+def create_board_cache() -> ViewCache:
+    # KANBAN_BOARD_CACHE caps how many opened boards keep their views built,
+    # KANBAN_BOARD_CACHE_CARDS how many card rows those views hold together
+    return ViewCache(
+        max_views=int(os.getenv("KANBAN_BOARD_CACHE", "8")),
+        max_cost=int(os.getenv("KANBAN_BOARD_CACHE_CARDS", "5000")),
+        cost=Board.size,
+    )
+
+
+# every session works on the same store; each gets its own ExecutorStore so
+# its change feed subscription can tell its own writes from everyone else's
+shared_store: DataStore | None = None
+store_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="store")
+
 
-    def delete_board(self, e):
-        self.store.remove_board(e.control.data)
-        self.set_all_boards_view()
+def session_store() -> AsyncDataStore:
+    global shared_store
+    if shared_store is None:
+        shared_store = create_store()
+    return ExecutorStore(shared_store, store_executor)
 
 
-def main(page: ft.Page):
+async def main(page: ft.Page):
 
     page.title = "Flet Trello clone"
     page.padding = 0
@@ -215,10 +338,12 @@ def main(page: ft.Page):
     page.theme_mode = ft.ThemeMode.LIGHT
     page.theme.page_transitions.windows = "cupertino"
     page.fonts = {"Pacifico": "Pacifico-Regular.ttf"}
-    app = TrelloApp(page, InMemoryStore())
+    app = TrelloApp(page, session_store())
     page.add(app)
     page.update()
-    app.initialize()
+    await app.initialize()
 
 
+# KANBAN_LOG_LEVEL=INFO logs the board view cache's stats on each eviction
+logging.basicConfig(level=os.getenv("KANBAN_LOG_LEVEL", "WARNING"))
 ft.app(target=main, assets_dir="../assets")
\ No newline at end of file
@@ -1,68 +1,661 @@
+import threading
+from contextlib import contextmanager
+from itertools import chain
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from board import Board
-    from board_list import BoardList
-    from user import User
-    from item import Item
+    from journal import Journal
 
+from change_feed import ChangeEvent, ChangeFeed, ChangeKind
 from data_store import DataStore
+from models import BoardModel, BoardListModel, ItemModel
+from ordered_index import OrderedIndex
+from order_key import key_between, keys_between
+from persistent import PersistentMap, PersistentVector
+from search_index import SearchIndex
+from user import User
 
 
-class InMemoryStore(DataStore):
-    def __init__(self):
-        self.boards: dict[int, "Board"] = {}
-        self.users: dict[str, "User"] = {}
-        self.board_lists: dict[int, list["BoardList"]] = {}
-        self.items: dict[int, list["Item"]] = {}
+class MemorySnapshot(DataStore):
+    # An immutable view of an InMemoryStore's boards, users, lists and cards.
+    # Readers use whichever snapshot was current when they started, without
+    # taking the writer lock. Records are replaced rather than modified, and
+    # the maps and per-list vectors are persistent, so a write copies only
+    # the paths to what it changed and shares everything else with the
+    # previous snapshot.
+
+    def __init__(
+        self,
+        boards: PersistentMap,
+        users: dict[str, User],
+        lists_by_id: PersistentMap,
+        items_by_id: PersistentMap,
+        lists: PersistentMap,
+        items: PersistentMap,
+    ):
+        self.boards = boards
+        self.users = users
+        self.lists_by_id = lists_by_id
+        self.items_by_id = items_by_id
+        # board id -> PersistentVector of its lists, list id -> of its cards
+        self.lists = lists
+        self.items = items
 
-    def add_board(self, board: "Board"):
-        self.boards[board.board_id] = board
+    def snapshot(self):
+        return self
 
     def get_board(self, id: int):
         return self.boards[id]
 
-    def update_board(self, board: "Board", update: dict):
-        for k in update:
-            setattr(board, k, update[k])
-
     def get_boards(self):
-        return [self.boards[b] for b in self.boards]
+        return list(self.boards.values())
+
+    def get_users(self):
+        return list(self.users.values())
+
+    def get_user(self, id: str):
+        return self.users.get(id)
+
+    def get_lists(self):
+        return list(chain.from_iterable(self.lists.values()))
+
+    def get_list(self, id: int):
+        return self.lists_by_id.get(id)
+
+    def get_lists_by_board(self, board: int):
+        return list(self.lists.get(board, ()))
+
+    def get_items(self, board_list: int):
+        return list(self.items.get(board_list, ()))
+
+    def get_item(self, id: int):
+        return self.items_by_id.get(id)
+
+    def get_items_by_board(self, board: int):
+        return [
+            item
+            for l in self.lists.get(board, ())
+            for item in self.items.get(l.board_list_id, ())
+        ]
+
+
+class LiveIndex(OrderedIndex):
+    # The store's working order of one board's lists or one list's cards.
+    # Each edit is also logged by position, and publish() replays the log
+    # onto the snapshot's PersistentVector instead of copying the order.
+
+    def __init__(self):
+        # not in any snapshot yet: publish builds its vector in one pass
+        self.fresh = True
+        self.edits: list[tuple] = []
+        super().__init__()
+
+    def insert_before(self, key, value, before=None):
+        if key in self.values:
+            self.set(key, value)
+            self.move_before(key, before)
+            return
+        super().insert_before(key, value, before)
+        if not self.fresh:
+            self.edits.append(("insert", self.index(key), value))
+
+    def move_before(self, key, before=None):
+        if self.fresh:
+            super().move_before(key, before)
+            return
+        position = self.index(key)
+        super().move_before(key, before)
+        moved = self.index(key)
+        if moved != position:
+            self.edits.append(("delete", position))
+            self.edits.append(("insert", moved, self.values[key]))
 
-    def remove_board(self, board: "Board"):
-        del self.boards[board.board_id]
-        self.board_lists[board.board_id] = []
+    def remove(self, key):
+        position = None if self.fresh else self.index(key)
+        value = super().remove(key)
+        if position is not None:
+            self.edits.append(("delete", position))
+        return value
 
-    def add_list(self, board: int, list: "BoardList"):
-        if board in self.board_lists:
-            self.board_lists[board].append(list)
+    def set(self, key, value):
+        super().set(key, value)
+        if not self.fresh:
+            self.edits.append(("set", self.index(key), value))
+
+    def publish(self, vector: PersistentVector | None) -> PersistentVector:
+        # the snapshot's vector brought up to date with this index
+        if self.fresh or vector is None:
+            vector = PersistentVector(self)
         else:
-            self.board_lists[board] = [list]
+            for edit in self.edits:
+                if edit[0] == "insert":
+                    vector = vector.insert(edit[1], edit[2])
+                elif edit[0] == "delete":
+                    vector = vector.delete(edit[1])
+                else:
+                    vector = vector.set(edit[1], edit[2])
+        self.fresh = False
+        self.edits = []
+        return vector
+
+
+class InMemoryStore(DataStore):
+    # One store is shared by every session. Writers hold `lock` for the
+    # length of a transaction and publish a new MemorySnapshot when it ends;
+    # all reads are served from the current snapshot. Records handed out are
+    # never modified: updates replace them, and update_* and move_items
+    # return the new records.
+
+    def __init__(self, journal: "Journal | None" = None):
+        # with a journal every mutation is also appended to it, so the
+        # store's contents survive a restart
+        self.journal = journal
+        self.lock = threading.RLock()
+        self.boards: dict[int, BoardModel] = {}
+        self.users: dict[str, User] = {}
+        self.board_lists: dict[int, LiveIndex] = {}
+        self.items: dict[int, LiveIndex] = {}
+        # secondary indexes, kept in step with the collections above
+        self.items_by_id: dict[int, ItemModel] = {}
+        self.lists_by_id: dict[int, BoardListModel] = {}
+        self.list_board: dict[int, int] = {}
+        # journal ops and change events collected while a transaction is open
+        self.pending: list[tuple] | None = None
+        self.changes: list[ChangeEvent] = []
+        self.feed = ChangeFeed()
+        # what the open transaction changed, for the next snapshot: records
+        # by id, and the boards and lists whose order of lists or cards moved
+        self.dirty_users = False
+        self.dirty_boards: set[int] = set()
+        self.dirty_list_records: set[int] = set()
+        self.dirty_item_records: set[int] = set()
+        self.dirty_lists: set[int] = set()
+        self.dirty_items: set[int] = set()
+        empty = PersistentMap()
+        self.current = MemorySnapshot(empty, {}, empty, empty, empty, empty)
+        if journal is not None:
+            with self.transaction():
+                self.load(journal.recovered)
+        self.search_index = SearchIndex(self)
+
+    def load(self, state: dict):
+        # rebuild from recovered journal state, keeping the stored order keys
+        for id, board in state["boards"].items():
+            self.boards[id] = BoardModel(board["name"], board_id=id)
+            self.dirty_boards.add(id)
+        for name, password in state["users"].items():
+            self.users[name] = User(name, password)
+        self.dirty_users = True
+        lists = sorted(state["lists"].items(), key=lambda l: l[1]["position"])
+        for id, l in lists:
+            self.index_list(
+                BoardListModel(
+                    l["board"], l["title"], l["color"], l["position"], board_list_id=id
+                )
+            )
+        items = sorted(state["items"].items(), key=lambda i: i[1]["position"])
+        for id, i in items:
+            self.index_item(
+                ItemModel(
+                    i["list"], i["item_text"], i["labels"], i["position"], item_id=id
+                )
+            )
+        if self.boards:
+            BoardModel.resume_ids(max(self.boards))
+        if self.lists_by_id:
+            BoardListModel.resume_ids(max(self.lists_by_id))
+        if self.items_by_id:
+            ItemModel.resume_ids(max(self.items_by_id))
+
+    @contextmanager
+    def transaction(self):
+        # mutations apply immediately to the live collections; the snapshot
+        # readers see, the journal batch and the change events all follow
+        # when the outermost transaction ends. If it ends with an exception
+        # the live collections go back to the last snapshot and nothing is
+        # published, journaled or emitted.
+        with self.lock:
+            if self.pending is not None:
+                yield self
+                return
+            self.pending = []
+            try:
+                yield self
+            except BaseException:
+                self.pending = None
+                self.changes = []
+                self.rollback()
+                raise
+            ops, self.pending = self.pending, None
+            changes, self.changes = self.changes, []
+            self.publish()
+            if self.journal is not None and ops:
+                self.journal.append(ops[0] if len(ops) == 1 else ("batch", ops))
+            if changes:
+                self.feed.publish(changes)
+
+    def rollback(self):
+        # restore everything the transaction marked dirty from the current
+        # snapshot, which still holds the state it started from
+        current = self.current
+        for id in self.dirty_boards:
+            self.restore(self.boards, id, current.boards.get(id))
+        if self.dirty_users:
+            self.users = dict(current.users)
+        for id in self.dirty_list_records:
+            list = current.lists_by_id.get(id)
+            self.restore(self.lists_by_id, id, list)
+            self.restore(self.list_board, id, list and list.board_id)
+        for id in self.dirty_item_records:
+            self.restore(self.items_by_id, id, current.items_by_id.get(id))
+        for board in self.dirty_lists:
+            lists = self.rebuild(current.lists.get(board), "board_list_id")
+            self.restore(self.board_lists, board, lists)
+        for board_list in self.dirty_items:
+            items = self.rebuild(current.items.get(board_list), "item_id")
+            self.restore(self.items, board_list, items)
+        self.clear_dirty()
+
+    def clear_dirty(self):
+        self.dirty_users = False
+        self.dirty_boards = set()
+        self.dirty_list_records = set()
+        self.dirty_item_records = set()
+        self.dirty_lists = set()
+        self.dirty_items = set()
+
+    @staticmethod
+    def restore(collection: dict, key, value):
+        if value is None:
+            collection.pop(key, None)
+        else:
+            collection[key] = value
+
+    @staticmethod
+    def rebuild(vector: PersistentVector | None, id: str) -> LiveIndex | None:
+        # a live index matching a snapshot vector, with nothing to publish
+        if vector is None:
+            return None
+        index = LiveIndex()
+        for record in vector:
+            index.append(getattr(record, id), record)
+        index.fresh = False
+        return index
+
+    def publish(self):
+        # path copying: only the records and orders this transaction touched
+        # are new in the snapshot, everything else is shared with the last
+        current = self.current
+        boards = current.boards.evolve(
+            {id: self.boards.get(id) for id in self.dirty_boards}
+        )
+        users = dict(self.users) if self.dirty_users else current.users
+        lists_by_id = current.lists_by_id.evolve(
+            {id: self.lists_by_id.get(id) for id in self.dirty_list_records}
+        )
+        items_by_id = current.items_by_id.evolve(
+            {id: self.items_by_id.get(id) for id in self.dirty_item_records}
+        )
+        lists = current.lists.evolve(
+            {
+                board: self.board_lists[board].publish(current.lists.get(board))
+                if board in self.board_lists
+                else None
+                for board in self.dirty_lists
+            }
+        )
+        items = current.items.evolve(
+            {
+                board_list: self.items[board_list].publish(current.items.get(board_list))
+                if board_list in self.items
+                else None
+                for board_list in self.dirty_items
+            }
+        )
+        self.clear_dirty()
+        self.current = MemorySnapshot(
+            boards, users, lists_by_id, items_by_id, lists, items
+        )
+
+    def snapshot(self):
+        return self.current
+
+    def search(self, query: str, limit: int = 20):
+        return self.search_index.search(query, limit)
+
+    def subscribe(
+        self, board_id: int | None = None, max_pending: int = 256, origin=None
+    ):
+        return self.feed.subscribe(board_id, max_pending, origin)
+
+    def add_board(self, board: BoardModel):
+        with self.transaction():
+            self.dirty_boards.add(board.board_id)
+            self.boards[board.board_id] = board
+            self.log("add_board", board.board_id, board.name)
+            self.emit(ChangeEvent(ChangeKind.BOARD_ADDED, board.board_id, model=board))
+        return board
+
+    def get_board(self, id: int):
+        return self.current.get_board(id)
+
+    def update_board(self, board: BoardModel, update: dict):
+        with self.transaction():
+            board = self.boards[board.board_id].replace(**update)
+            self.dirty_boards.add(board.board_id)
+            self.boards[board.board_id] = board
+            self.log("update_board", board.board_id, update)
+            self.emit(
+                ChangeEvent(ChangeKind.BOARD_UPDATED, board.board_id, model=board)
+            )
+            return board
+
+    def get_boards(self):
+        return self.current.get_boards()
+
+    def remove_board(self, board: BoardModel):
+        with self.transaction():
+            self.dirty_boards.add(board.board_id)
+            self.dirty_lists.add(board.board_id)
+            del self.boards[board.board_id]
+            for l in self.board_lists.pop(board.board_id, ()):
+                self.drop_list_indexes(l.board_list_id)
+            self.log("remove_board", board.board_id)
+            self.emit(ChangeEvent(ChangeKind.BOARD_REMOVED, board.board_id))
+
+    def add_list(self, board: int, list: BoardListModel, before: int | None = None):
+        with self.transaction():
+            list = list.replace(
+                board_id=board,
+                position=self.key_before(self.board_lists.get(board), before),
+            )
+            self.index_list(list, before)
+            self.log(
+                "add_list",
+                board,
+                list.board_list_id,
+                list.title,
+                list.color,
+                list.position,
+            )
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.LIST_ADDED,
+                    board,
+                    list.board_list_id,
+                    before=before,
+                    model=list,
+                )
+            )
+        return list
+
+    def index_list(self, list: BoardListModel, before: int | None = None):
+        board = list.board_id
+        # marked first, so a failed insert is still rolled back
+        self.dirty_lists.add(board)
+        self.dirty_list_records.add(list.board_list_id)
+        if board not in self.board_lists:
+            self.board_lists[board] = LiveIndex()
+        self.board_lists[board].insert_before(list.board_list_id, list, before)
+        self.lists_by_id[list.board_list_id] = list
+        self.list_board[list.board_list_id] = board
+
+    def get_lists(self):
+        return self.current.get_lists()
+
+    def get_list(self, id: int):
+        return self.current.get_list(id)
 
     def get_lists_by_board(self, board: int):
-        return self.board_lists.get(board, [])
+        return self.current.get_lists_by_board(board)
+
+    def update_list(self, board_list: BoardListModel, update: dict):
+        with self.transaction():
+            board_list = self.lists_by_id[board_list.board_list_id].replace(**update)
+            self.put_list(board_list)
+            self.log("update_list", board_list.board_list_id, update)
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.LIST_UPDATED,
+                    board_list.board_id,
+                    board_list.board_list_id,
+                    model=board_list,
+                )
+            )
+            return board_list
+
+    def put_list(self, list: BoardListModel):
+        # swap in a replacement record for a list already in the store
+        self.dirty_lists.add(list.board_id)
+        self.dirty_list_records.add(list.board_list_id)
+        self.board_lists[list.board_id].set(list.board_list_id, list)
+        self.lists_by_id[list.board_list_id] = list
+
+    def move_list(self, board: int, id: int, before: int | None = None):
+        with self.transaction():
+            index = self.board_lists[board]
+            self.dirty_lists.add(board)
+            index.move_before(id, before)
+            list = self.lists_by_id[id].replace(position=self.key_at(index, id))
+            self.put_list(list)
+            self.log("move_list", id, {"position": list.position})
+            self.emit(ChangeEvent(ChangeKind.LIST_MOVED, board, id, before=before))
 
     def remove_list(self, board: int, id: int):
-        self.board_lists[board] = [
-            l for l in self.board_lists[board] if not l.board_list_id == id
-        ]
+        with self.transaction():
+            self.dirty_lists.add(board)
+            self.board_lists[board].pop(id)
+            self.drop_list_indexes(id)
+            self.log("remove_list", id)
+            self.emit(ChangeEvent(ChangeKind.LIST_REMOVED, board, id))
 
-    def add_user(self, user: "User"):
-        self.users[user.name] = user
+    def drop_list_indexes(self, id: int):
+        self.dirty_list_records.add(id)
+        self.dirty_items.add(id)
+        for i in self.items.pop(id, ()):
+            self.dirty_item_records.add(i.item_id)
+            self.items_by_id.pop(i.item_id, None)
+        self.lists_by_id.pop(id, None)
+        self.list_board.pop(id, None)
+
+    def add_user(self, user: User):
+        with self.transaction():
+            self.users[user.name] = user
+            self.dirty_users = True
+            self.log("add_user", user.name, user.password)
 
     def get_users(self):
-        return [self.users[u] for u in self.users]
+        return self.current.get_users()
 
-    def add_item(self, board_list: int, item: "Item"):
-        if board_list in self.items:
-            self.items[board_list].append(item)
-        else:
-            self.items[board_list] = [item]
+    def get_user(self, id: str):
+        return self.current.get_user(id)
+
+    def remove_user(self, id: str):
+        with self.transaction():
+            self.users.pop(id, None)
+            self.dirty_users = True
+            self.log("remove_user", id)
+
+    def add_item(self, board_list: int, item: ItemModel, before: int | None = None):
+        with self.transaction():
+            item = item.replace(
+                board_list_id=board_list,
+                position=self.key_before(self.items.get(board_list), before),
+            )
+            self.index_item(item, before)
+            self.log(
+                "add_item",
+                board_list,
+                item.item_id,
+                item.item_text,
+                item.labels,
+                item.position,
+            )
+            self.emit_item(ChangeKind.ITEM_ADDED, item, before=before)
+        return item
+
+    def index_item(self, item: ItemModel, before: int | None = None):
+        board_list = item.board_list_id
+        self.dirty_items.add(board_list)
+        self.dirty_item_records.add(item.item_id)
+        if board_list not in self.items:
+            self.items[board_list] = LiveIndex()
+        self.items[board_list].insert_before(item.item_id, item, before)
+        self.items_by_id[item.item_id] = item
 
     def get_items(self, board_list: int):
-        return self.items.get(board_list, [])
+        return self.current.get_items(board_list)
+
+    def get_item(self, id: int):
+        return self.current.get_item(id)
+
+    def get_items_by_board(self, board: int):
+        return self.current.get_items_by_board(board)
+
+    def update_item(self, item: ItemModel, update: dict):
+        with self.transaction():
+            item = self.items_by_id[item.item_id].replace(**update)
+            self.put_item(item)
+            self.log("update_item", item.item_id, update)
+            self.emit_item(ChangeKind.ITEM_UPDATED, item)
+            return item
+
+    def put_item(self, item: ItemModel):
+        # swap in a replacement record for a card already in the store
+        self.dirty_items.add(item.board_list_id)
+        self.dirty_item_records.add(item.item_id)
+        self.items[item.board_list_id].set(item.item_id, item)
+        self.items_by_id[item.item_id] = item
+
+    def move_item(self, board_list: int, id: int, before: int | None = None):
+        with self.transaction():
+            index = self.items[board_list]
+            self.dirty_items.add(board_list)
+            index.move_before(id, before)
+            item = self.items_by_id[id].replace(position=self.key_at(index, id))
+            self.put_item(item)
+            self.log("move_item", id, {"position": item.position})
+            self.emit_item(
+                ChangeKind.ITEM_MOVED, item, before=before, from_list=board_list
+            )
+            return item
 
     def remove_item(self, board_list: int, id: int):
-        self.items[board_list] = [
-            i for i in self.items[board_list] if not i.item_id == id
-        ]
+        with self.transaction():
+            if id not in self.items[board_list]:
+                # moved or removed by someone else first; like SqliteStore's
+                # DELETE ... WHERE list_id, this leaves the card where it is
+                return
+            self.dirty_items.add(board_list)
+            self.dirty_item_records.add(id)
+            self.items[board_list].pop(id)
+            self.items_by_id.pop(id, None)
+            self.log("remove_item", id)
+            board = self.list_board.get(board_list)
+            self.emit(ChangeEvent(ChangeKind.ITEM_REMOVED, board, board_list, id))
+
+    def add_items(self, board_list: int, items: list[ItemModel], before: int | None = None):
+        with self.transaction():
+            keys = self.keys_before(self.items.get(board_list), before, len(items))
+            items = [
+                item.replace(board_list_id=board_list, position=key)
+                for item, key in zip(items, keys)
+            ]
+            for item in items:
+                self.index_item(item, before)
+            for item in items:
+                self.log(
+                    "add_item",
+                    board_list,
+                    item.item_id,
+                    item.item_text,
+                    item.labels,
+                    item.position,
+                )
+                self.emit_item(ChangeKind.ITEM_ADDED, item, before=before)
+        return items
+
+    def move_items(
+        self, src_list: int, dst_list: int, ids: list[int], before: int | None = None
+    ):
+        with self.transaction():
+            source = self.items[src_list]
+            self.dirty_items.add(src_list)
+            # remove, not pop: a stale id fails the batch, which rolls back
+            taken = [source.remove(id) for id in ids]
+            keys = self.keys_before(self.items.get(dst_list), before, len(ids))
+            moved = [
+                item.replace(board_list_id=dst_list, position=key)
+                for item, key in zip(taken, keys)
+            ]
+            for item in moved:
+                self.index_item(item, before)
+            for item in moved:
+                self.log(
+                    "move_item",
+                    item.item_id,
+                    {"list": dst_list, "position": item.position},
+                )
+                self.emit_item(
+                    ChangeKind.ITEM_MOVED, item, before=before, from_list=src_list
+                )
+            return moved
+
+    def remove_items(self, board_list: int, ids: list[int]):
+        with self.transaction():
+            for id in ids:
+                self.remove_item(board_list, id)
+
+    def bulk_update_labels(self, ids: list[int], add=(), remove=()):
+        with self.transaction():
+            for id in ids:
+                item = self.items_by_id[id]
+                labels = [l for l in item.labels if l not in remove]
+                labels += [l for l in add if l not in labels]
+                self.update_item(item, {"labels": labels})
+
+    def log(self, *op):
+        # only called inside a transaction, which writes the journal
+        self.pending.append(op)
+
+    def emit(self, event: ChangeEvent):
+        self.changes.append(event)
+
+    def emit_item(self, kind: ChangeKind, item: ItemModel, **fields):
+        board_list = item.board_list_id
+        self.emit(
+            ChangeEvent(
+                kind,
+                self.list_board.get(board_list),
+                board_list,
+                item.item_id,
+                model=item,
+                **fields,
+            )
+        )
+
+    @staticmethod
+    def position(index: OrderedIndex, id):
+        return None if id is None else index.get(id).position
+
+    def key_at(self, index: OrderedIndex, id) -> str:
+        # an order key for the entry between its neighbours; nothing else in
+        # the collection is renumbered
+        return key_between(
+            self.position(index, index.prev_key(id)),
+            self.position(index, index.next_key(id)),
+        )
+
+    def key_before(self, index: OrderedIndex | None, before) -> str:
+        # the order key for a new entry inserted before `before`
+        return self.keys_before(index, before, 1)[0]
+
+    def keys_before(self, index: OrderedIndex | None, before, count: int) -> list[str]:
+        # order keys for a run of new entries inserted before `before`,
+        # spread between the neighbours of the run
+        if index is None or not len(index):
+            return keys_between(None, None, count)
+        prev = index.tail if before is None else index.prev_key(before)
+        return keys_between(
+            self.position(index, prev), self.position(index, before), count
+        )
@@ -0,0 +1,126 @@
+import itertools
+import threading
+
+# Plain records held by the DataStore implementations. They carry no Flet
+# state, so stores, journals and other headless code can use them without
+# importing flet; Board, BoardList and Item are views built from them.
+
+
+class LabelTable:
+    # Process-wide string table for card labels. Records keep small integer
+    # ids, so a label used on thousands of cards is stored once and label
+    # comparisons are int comparisons.
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+        self.lock = threading.Lock()
+
+    def intern(self, label: str) -> int:
+        id = self.ids.get(label)
+        if id is None:
+            with self.lock:
+                id = self.ids.get(label)
+                if id is None:
+                    id = self.ids[label] = len(self.names)
+                    self.names.append(label)
+        return id
+
+    def lookup(self, label: str) -> int | None:
+        return self.ids.get(label)
+
+    def encode(self, labels) -> tuple[int, ...]:
+        return tuple(self.intern(label) for label in labels)
+
+    def decode(self, ids: tuple[int, ...]) -> list[str]:
+        return [self.names[id] for id in ids]
+
+
+LABELS = LabelTable()
+
+
+class Record:
+    # Records are never modified once a store has handed them out; a change
+    # is a new record from replace(), so readers holding the old one (say,
+    # through a snapshot) keep a consistent value.
+
+    __slots__ = ()
+
+    def replace(self, **changes):
+        record = object.__new__(type(self))
+        for name in self.__slots__:
+            setattr(record, name, getattr(self, name))
+        for name, value in changes.items():
+            setattr(record, name, value)
+        return record
+
+
+class BoardModel(Record):
+    __slots__ = ("board_id", "name")
+    id_counter = itertools.count()
+
+    def __init__(self, name: str, board_id: int | None = None):
+        self.board_id = next(BoardModel.id_counter) if board_id is None else board_id
+        self.name = name
+
+    @classmethod
+    def resume_ids(cls, last_id: int):
+        # continue numbering after ids loaded from a persistent store
+        cls.id_counter = itertools.count(last_id + 1)
+
+
+class BoardListModel(Record):
+    __slots__ = ("board_list_id", "board_id", "title", "color", "position")
+    id_counter = itertools.count()
+
+    def __init__(
+        self,
+        board_id: int,
+        title: str,
+        color: str = "",
+        position: str = "",
+        board_list_id: int | None = None,
+    ):
+        self.board_list_id = (
+            next(BoardListModel.id_counter) if board_list_id is None else board_list_id
+        )
+        self.board_id = board_id
+        self.title = title
+        self.color = color
+        self.position = position
+
+    @classmethod
+    def resume_ids(cls, last_id: int):
+        cls.id_counter = itertools.count(last_id + 1)
+
+
+class ItemModel(Record):
+    __slots__ = ("item_id", "board_list_id", "item_text", "label_ids", "position")
+    id_counter = itertools.count()
+
+    def __init__(
+        self,
+        board_list_id: int,
+        item_text: str,
+        labels: list[str] | None = None,
+        position: str = "",
+        item_id: int | None = None,
+    ):
+        self.item_id = next(ItemModel.id_counter) if item_id is None else item_id
+        self.board_list_id = board_list_id
+        self.item_text = item_text
+        # an immutable tuple, so copies of a card can share it
+        self.label_ids: tuple[int, ...] = LABELS.encode(labels) if labels else ()
+        self.position = position
+
+    @property
+    def labels(self) -> list[str]:
+        return LABELS.decode(self.label_ids)
+
+    @labels.setter
+    def labels(self, labels: list[str]):
+        self.label_ids = LABELS.encode(labels)
+
+    @classmethod
+    def resume_ids(cls, last_id: int):
+        cls.id_counter = itertools.count(last_id + 1)
@@ -0,0 +1,123 @@
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+SMALLEST_INTEGER = "A" + "0" * 26
+
+# Order keys are strings that sort lexicographically in position order. Each
+# key is a variable-length base-62 integer part (its head character encodes
+# the length, so appends and prepends stay short) followed by an optional
+# fractional part used when a key has to go between two neighbours.
+
+
+def integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"invalid order key head: {head!r}")
+
+
+def integer_part(key: str) -> str:
+    length = integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"invalid order key: {key!r}")
+    return key[:length]
+
+
+def increment_integer(x: str) -> str | None:
+    head, digs = x[0], list(x[1:])
+    for i in reversed(range(len(digs))):
+        d = DIGITS.index(digs[i]) + 1
+        if d < len(DIGITS):
+            digs[i] = DIGITS[d]
+            return head + "".join(digs)
+        digs[i] = "0"
+    if head == "Z":
+        return "a0"
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digs.append("0")
+    else:
+        digs.pop()
+    return head + "".join(digs)
+
+
+def decrement_integer(x: str) -> str | None:
+    head, digs = x[0], list(x[1:])
+    for i in reversed(range(len(digs))):
+        d = DIGITS.index(digs[i]) - 1
+        if d >= 0:
+            digs[i] = DIGITS[d]
+            return head + "".join(digs)
+        digs[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digs.append(DIGITS[-1])
+    else:
+        digs.pop()
+    return head + "".join(digs)
+
+
+def midpoint(a: str, b: str | None) -> str:
+    # fractional parts never end in "0", so there is always room between two
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + midpoint(a[1:], None)
+
+
+def key_between(a: str | None, b: str | None) -> str:
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"order keys out of order: {a!r} >= {b!r}")
+    if a is None and b is None:
+        return "a0"
+    if a is None:
+        ib = integer_part(b)
+        fb = b[len(ib):]
+        if ib == SMALLEST_INTEGER:
+            return ib + midpoint("", fb)
+        if fb:
+            return ib
+        return decrement_integer(ib)
+    ia = integer_part(a)
+    fa = a[len(ia):]
+    if b is None:
+        i = increment_integer(ia)
+        return ia + midpoint(fa, None) if i is None else i
+    ib = integer_part(b)
+    fb = b[len(ib):]
+    if ia == ib:
+        return ia + midpoint(fa, fb)
+    i = increment_integer(ia)
+    if i is not None and i < b:
+        return i
+    return ia + midpoint(fa, None)
+
+
+def keys_between(a: str | None, b: str | None, n: int) -> list[str]:
+    # n ascending keys between a and b, split by halves so no key grows
+    # much longer than a single key_between would
+    if n <= 0:
+        return []
+    if b is None:
+        keys = []
+        for _ in range(n):
+            a = key_between(a, None)
+            keys.append(a)
+        return keys
+    mid = key_between(a, b)
+    half = n // 2
+    return keys_between(a, mid, half) + [mid] + keys_between(mid, b, n - half - 1)
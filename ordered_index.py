@@ -0,0 +1,231 @@
+class OrderedIndex:
+    # Id-keyed ordered collection. Keys are linked to their neighbours, so
+    # next/prev lookups are O(1). For positions the keys are also kept in
+    # blocks of at most 2 * LOAD, with a Fenwick tree over the block sizes:
+    # index(), slice() and every insert, move or delete cost O(log n) block
+    # steps plus work within one block, wherever in the list they land.
+
+    LOAD = 256
+
+    def __init__(self, items=()):
+        self.values: dict = {}
+        self.prev: dict = {}
+        self.next: dict = {}
+        self.head = None
+        self.tail = None
+        self.blocks: list[list] = []
+        # key -> the block holding it, and id(block) -> its number
+        self.block_of: dict = {}
+        self.block_number: dict[int, int] = {}
+        # Fenwick tree over len(block), 1-based
+        self.tree: list[int] = [0]
+        for key, value in items:
+            self.append(key, value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __iter__(self):
+        values = self.values
+        for block in self.blocks:
+            for key in block:
+                yield values[key]
+
+    def keys(self):
+        for block in self.blocks:
+            yield from block
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        # replace the value stored under an existing key, in place
+        if key not in self.values:
+            raise KeyError(key)
+        self.values[key] = value
+
+    def first(self):
+        return None if self.head is None else self.values[self.head]
+
+    def last(self):
+        return None if self.tail is None else self.values[self.tail]
+
+    def next_key(self, key):
+        return self.next[key]
+
+    def prev_key(self, key):
+        return self.prev[key]
+
+    def index(self, key) -> int:
+        block = self.block_of[key]
+        return self.prefix(self.block_number[id(block)]) + block.index(key)
+
+    def slice(self, start: int, stop: int) -> list:
+        # keys at positions start..stop-1
+        start = max(start, 0)
+        stop = min(stop, len(self.values))
+        if start >= stop:
+            return []
+        number, offset = self.locate(start)
+        keys = []
+        while len(keys) < stop - start:
+            block = self.blocks[number]
+            keys.extend(block[offset : offset + stop - start - len(keys)])
+            number += 1
+            offset = 0
+        return keys
+
+    def append(self, key, value):
+        self.insert_before(key, value, None)
+
+    def insert_before(self, key, value, before=None):
+        if key in self.values:
+            self.values[key] = value
+            self.move_before(key, before)
+            return
+        self.values[key] = value
+        self.link(key, before)
+        self.place(key, before)
+
+    def move_before(self, key, before=None):
+        if key == before or self.next[key] == before:
+            return
+        self.unplace(key)
+        self.unlink(key)
+        self.link(key, before)
+        self.place(key, before)
+
+    def remove(self, key):
+        self.unplace(key)
+        self.unlink(key)
+        del self.prev[key], self.next[key]
+        return self.values.pop(key)
+
+    def pop(self, key, default=None):
+        return self.remove(key) if key in self.values else default
+
+    def link(self, key, before):
+        after = self.tail if before is None else self.prev[before]
+        self.prev[key] = after
+        self.next[key] = before
+        if after is None:
+            self.head = key
+        else:
+            self.next[after] = key
+        if before is None:
+            self.tail = key
+        else:
+            self.prev[before] = key
+
+    def unlink(self, key):
+        after, before = self.prev[key], self.next[key]
+        if after is None:
+            self.head = before
+        else:
+            self.next[after] = before
+        if before is None:
+            self.tail = after
+        else:
+            self.prev[before] = after
+
+    def place(self, key, before):
+        # put key in the block of the key it goes before; appends go to the
+        # last block, or a new one once that is full
+        if before is not None:
+            block = self.block_of[before]
+            block.insert(block.index(before), key)
+        elif self.blocks and len(self.blocks[-1]) < 2 * self.LOAD:
+            block = self.blocks[-1]
+            block.append(key)
+        else:
+            block = [key]
+            self.blocks.append(block)
+            self.block_number[id(block)] = len(self.blocks) - 1
+            self.tree.append(0)
+            self.fix_tail_node()
+        self.block_of[key] = block
+        number = self.block_number[id(block)]
+        self.grow(number, 1)
+        if len(block) > 2 * self.LOAD:
+            self.split(number)
+
+    def unplace(self, key):
+        block = self.block_of.pop(key)
+        block.remove(key)
+        number = self.block_number[id(block)]
+        if not block:
+            del self.blocks[number]
+            del self.block_number[id(block)]
+            self.renumber(number)
+        elif (
+            len(block) < self.LOAD // 2
+            and number + 1 < len(self.blocks)
+            and len(block) + len(self.blocks[number + 1]) <= self.LOAD
+        ):
+            # fold a block that has shrunk into its successor, so deletes do
+            # not leave the list spread over many small blocks
+            following = self.blocks.pop(number + 1)
+            del self.block_number[id(following)]
+            for moved in following:
+                self.block_of[moved] = block
+            block.extend(following)
+            self.renumber(number)
+        else:
+            self.grow(number, -1)
+
+    def split(self, number: int):
+        block = self.blocks[number]
+        half = block[self.LOAD :]
+        del block[self.LOAD :]
+        self.blocks.insert(number + 1, half)
+        for key in half:
+            self.block_of[key] = half
+        self.renumber(number + 1)
+
+    def renumber(self, start: int):
+        # blocks from start on changed number; the tree is rebuilt in O(blocks)
+        for number in range(start, len(self.blocks)):
+            self.block_number[id(self.blocks[number])] = number
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def fix_tail_node(self):
+        # a node appended to the tree covers (i - lowbit(i), i]; the blocks
+        # before the new one are already summed by earlier nodes
+        i = len(self.tree) - 1
+        low = i - (i & -i)
+        self.tree[i] = self.prefix(i - 1) - self.prefix(low)
+
+    def grow(self, number: int, delta: int):
+        i = number + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, number: int) -> int:
+        # total size of the blocks before block `number`
+        total = 0
+        i = number
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def locate(self, position: int) -> tuple[int, int]:
+        # (block number, offset in it) of a position
+        number = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            next = number + step
+            if next < len(self.tree) and self.tree[next] <= position:
+                number = next
+                position -= self.tree[next]
+            step >>= 1
+        return number, position
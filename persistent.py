@@ -0,0 +1,245 @@
+class PersistentMap:
+    # Immutable map from non-negative int ids to values, stored as a 32-way
+    # trie over the key bits. evolve() returns a new map that copies only
+    # the nodes on the paths to the changed keys and shares the rest with
+    # this one, so a snapshot that changes k entries costs O(k log n), not a
+    # copy of every entry. None is not a storable value: it means "absent".
+
+    __slots__ = ("root", "shift")
+
+    BITS = 5
+    WIDTH = 1 << BITS
+    MASK = WIDTH - 1
+
+    def __init__(self, root: tuple | None = None, shift: int = 0):
+        # shift is the bit offset of the root's slot index; 0 means the
+        # root's slots are the values themselves
+        self.root = root
+        self.shift = shift
+
+    def get(self, key: int, default=None):
+        if key >> (self.shift + self.BITS):
+            return default
+        node = self.root
+        shift = self.shift
+        while node is not None:
+            node = node[(key >> shift) & self.MASK]
+            if shift == 0:
+                return default if node is None else node
+            shift -= self.BITS
+        return default
+
+    def __contains__(self, key: int):
+        return self.get(key) is not None
+
+    def __getitem__(self, key: int):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def values(self):
+        # in key order
+        if self.root is not None:
+            yield from self.walk(self.root, self.shift)
+
+    __iter__ = values
+
+    def walk(self, node: tuple, shift: int):
+        for slot in node:
+            if slot is None:
+                continue
+            if shift == 0:
+                yield slot
+            else:
+                yield from self.walk(slot, shift - self.BITS)
+
+    def evolve(self, changes: dict) -> "PersistentMap":
+        # a new map with changes applied; a None value removes the key
+        if not changes:
+            return self
+        root, shift = self.root, self.shift
+        top = max(changes)
+        while top >> (shift + self.BITS):
+            if root is not None:
+                root = (root,) + (None,) * self.MASK
+            shift += self.BITS
+        root = self.assoc(root, shift, sorted(changes.items()))
+        return PersistentMap(root, shift if root is not None else 0)
+
+    def assoc(self, node: tuple | None, shift: int, changes: list) -> tuple | None:
+        slots = [None] * self.WIDTH if node is None else list(node)
+        if shift == 0:
+            for key, value in changes:
+                slots[key & self.MASK] = value
+        else:
+            # changes are sorted, so keys under one slot are consecutive
+            start = 0
+            while start < len(changes):
+                slot = (changes[start][0] >> shift) & self.MASK
+                stop = start + 1
+                while (
+                    stop < len(changes)
+                    and (changes[stop][0] >> shift) & self.MASK == slot
+                ):
+                    stop += 1
+                slots[slot] = self.assoc(
+                    slots[slot], shift - self.BITS, changes[start:stop]
+                )
+                start = stop
+        if all(slot is None for slot in slots):
+            return None
+        return tuple(slots)
+
+
+class Branch:
+    __slots__ = ("children", "counts", "size")
+
+    def __init__(self, children: tuple, counts: tuple):
+        self.children = children
+        self.counts = counts
+        self.size = sum(counts)
+
+
+class PersistentVector:
+    # Immutable sequence stored as a B-tree whose leaves are tuples of up to
+    # MAX values. insert, delete and set return a new vector that copies one
+    # root-to-leaf path, O(MAX log n), and shares every other node, so a
+    # list of thousands of cards is not re-copied when one card changes.
+
+    __slots__ = ("root",)
+
+    MAX = 32
+    MIN = MAX // 4
+
+    def __init__(self, values=(), root=None):
+        if root is None:
+            root = self.build(tuple(values))
+        self.root = root
+
+    @classmethod
+    def build(cls, values: tuple):
+        # bulk load: full leaves, then full branches above them
+        nodes = [values[i : i + cls.MAX] for i in range(0, len(values), cls.MAX)]
+        if not nodes:
+            return ()
+        while len(nodes) > 1:
+            nodes = [
+                Branch(
+                    tuple(nodes[i : i + cls.MAX]),
+                    tuple(cls.size(node) for node in nodes[i : i + cls.MAX]),
+                )
+                for i in range(0, len(nodes), cls.MAX)
+            ]
+        return nodes[0]
+
+    @staticmethod
+    def size(node) -> int:
+        return node.size if isinstance(node, Branch) else len(node)
+
+    def __len__(self):
+        return self.size(self.root)
+
+    def __iter__(self):
+        return self.walk(self.root)
+
+    def walk(self, node):
+        if isinstance(node, Branch):
+            for child in node.children:
+                yield from self.walk(child)
+        else:
+            yield from node
+
+    def __getitem__(self, index: int):
+        node = self.root
+        while isinstance(node, Branch):
+            slot, index = self.find(node, index)
+            node = node.children[slot]
+        return node[index]
+
+    @staticmethod
+    def find(node: Branch, index: int, inserting: bool = False) -> tuple[int, int]:
+        # child holding position index, and the position within it; an
+        # insert at the very end goes to the last child
+        last = len(node.counts) - 1
+        for slot, count in enumerate(node.counts):
+            if index < count or (inserting and slot == last):
+                return slot, index
+            index -= count
+        raise IndexError(index)
+
+    def set(self, index: int, value) -> "PersistentVector":
+        return PersistentVector(root=self.replace(self.root, index, value))
+
+    def replace(self, node, index: int, value):
+        if not isinstance(node, Branch):
+            return node[:index] + (value,) + node[index + 1 :]
+        slot, index = self.find(node, index)
+        children = list(node.children)
+        children[slot] = self.replace(children[slot], index, value)
+        return Branch(tuple(children), node.counts)
+
+    def insert(self, index: int, value) -> "PersistentVector":
+        if not 0 <= index <= len(self):
+            raise IndexError(index)
+        nodes = self.add(self.root, index, value)
+        if len(nodes) == 1:
+            return PersistentVector(root=nodes[0])
+        return PersistentVector(
+            root=Branch(tuple(nodes), tuple(self.size(n) for n in nodes))
+        )
+
+    def add(self, node, index: int, value) -> list:
+        # the node with value inserted, split in two if it overflowed
+        if not isinstance(node, Branch):
+            return self.halve(node[:index] + (value,) + node[index:])
+        slot, index = self.find(node, index, inserting=True)
+        children = list(node.children)
+        children[slot : slot + 1] = self.add(children[slot], index, value)
+        return [self.branch(part) for part in self.halve(tuple(children))]
+
+    def delete(self, index: int) -> "PersistentVector":
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        root = self.cut(self.root, index)
+        # a branch left with one child hands the root down to it
+        while isinstance(root, Branch) and len(root.children) == 1:
+            root = root.children[0]
+        return PersistentVector(root=root)
+
+    def cut(self, node, index: int):
+        if not isinstance(node, Branch):
+            return node[:index] + node[index + 1 :]
+        slot, index = self.find(node, index)
+        children = list(node.children)
+        child = self.cut(children[slot], index)
+        if not self.size(child):
+            del children[slot]
+        elif self.width(child) < self.MIN and len(children) > 1:
+            # fold an underfull child into a neighbour, re-splitting if the
+            # two together overflow
+            other = slot + 1 if slot + 1 < len(children) else slot - 1
+            first, second = sorted((slot, other))
+            pair = [child if i == slot else children[i] for i in (first, second)]
+            children[first : second + 1] = self.merge(*pair)
+        else:
+            children[slot] = child
+        return self.branch(tuple(children)) if children else ()
+
+    def merge(self, left, right) -> list:
+        if isinstance(left, Branch):
+            parts = self.halve(left.children + right.children)
+            return [self.branch(part) for part in parts]
+        return self.halve(left + right)
+
+    def width(self, node) -> int:
+        return len(node.children) if isinstance(node, Branch) else len(node)
+
+    def halve(self, entries: tuple) -> list:
+        if len(entries) <= self.MAX:
+            return [entries]
+        middle = len(entries) // 2
+        return [entries[:middle], entries[middle:]]
+
+    def branch(self, children: tuple) -> Branch:
+        return Branch(children, tuple(self.size(child) for child in children))
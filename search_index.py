@@ -0,0 +1,195 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING
+
+from change_feed import ChangeEvent, ChangeKind
+
+if TYPE_CHECKING:
+    from data_store import DataStore
+
+TOKEN = re.compile(r"\w+")
+
+# a query term that is a prefix of more tokens than this is not sized; it
+# only drives a search when every term is that broad
+MAX_EXPANSION = 64
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+class SearchHit:
+    __slots__ = ("kind", "board_id", "list_id", "item_id", "text")
+
+    def __init__(self, kind: str, board_id: int, list_id, item_id, text: str):
+        self.kind = kind
+        self.board_id = board_id
+        self.list_id = list_id
+        self.item_id = item_id
+        self.text = text
+
+
+class SearchIndex:
+    # Inverted index over board names, list titles, card text and labels.
+    # Documents are keyed ("board" | "list" | "item", id). The vocabulary is
+    # kept sorted so a query term matches every token it is a prefix of with
+    # two bisects. The index follows the store's change feed, so it is
+    # updated inside the same commit as the mutation it mirrors.
+
+    def __init__(self, store: "DataStore"):
+        self.lock = threading.Lock()
+        self.postings: dict[str, set[tuple]] = {}
+        self.vocabulary: list[str] = []
+        self.docs: dict[tuple, SearchHit] = {}
+        self.doc_tokens: dict[tuple, tuple[str, ...]] = {}
+        # for cascading board and list removals
+        self.board_docs: dict[int, set[tuple]] = {}
+        self.list_docs: dict[int, set[tuple]] = {}
+        # stores create their index before any session can write
+        store.feed.listen(self.apply)
+        self.build(store.snapshot())
+
+    def build(self, store: "DataStore"):
+        with self.lock:
+            for board in store.get_boards():
+                self.add_board(board)
+                for l in store.get_lists_by_board(board.board_id):
+                    self.add_list(l)
+                    for item in store.get_items(l.board_list_id):
+                        self.add_item(board.board_id, item)
+
+    def apply(self, events: list[ChangeEvent]):
+        with self.lock:
+            for event in events:
+                self.apply_event(event)
+
+    def apply_event(self, event: ChangeEvent):
+        kind = event.kind
+        if kind in (ChangeKind.BOARD_ADDED, ChangeKind.BOARD_UPDATED):
+            self.add_board(event.model)
+        elif kind is ChangeKind.BOARD_REMOVED:
+            for key in list(self.board_docs.get(event.board_id, ())):
+                self.remove(key)
+        elif kind in (ChangeKind.LIST_ADDED, ChangeKind.LIST_UPDATED):
+            self.add_list(event.model)
+        elif kind is ChangeKind.LIST_REMOVED:
+            for key in list(self.list_docs.get(event.list_id, ())):
+                self.remove(key)
+            self.remove(("list", event.list_id))
+        elif kind in (ChangeKind.ITEM_ADDED, ChangeKind.ITEM_UPDATED):
+            self.add_item(event.board_id, event.model)
+        elif kind is ChangeKind.ITEM_MOVED:
+            self.move_item(event)
+        elif kind is ChangeKind.ITEM_REMOVED:
+            self.remove(("item", event.item_id))
+
+    def add_board(self, board):
+        self.add(
+            ("board", board.board_id),
+            SearchHit("board", board.board_id, None, None, board.name),
+            tokenize(board.name),
+        )
+
+    def add_list(self, l):
+        self.add(
+            ("list", l.board_list_id),
+            SearchHit("list", l.board_id, l.board_list_id, None, l.title),
+            tokenize(l.title),
+        )
+
+    def add_item(self, board_id: int, item):
+        tokens = tokenize(item.item_text)
+        for label in item.labels:
+            tokens += tokenize(label)
+        self.add(
+            ("item", item.item_id),
+            SearchHit(
+                "item", board_id, item.board_list_id, item.item_id, item.item_text
+            ),
+            tokens,
+        )
+
+    def move_item(self, event: ChangeEvent):
+        key = ("item", event.item_id)
+        if event.model is not None:
+            self.add_item(event.board_id, event.model)
+        elif key in self.docs:
+            hit = self.docs[key]
+            self.add(
+                key,
+                SearchHit(
+                    "item", event.board_id, event.list_id, hit.item_id, hit.text
+                ),
+                list(self.doc_tokens[key]),
+            )
+
+    def add(self, key: tuple, hit: SearchHit, tokens: list[str]):
+        self.remove(key)
+        tokens = tuple(dict.fromkeys(tokens))
+        self.docs[key] = hit
+        self.doc_tokens[key] = tokens
+        self.board_docs.setdefault(hit.board_id, set()).add(key)
+        if hit.kind == "item":
+            self.list_docs.setdefault(hit.list_id, set()).add(key)
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                insort(self.vocabulary, token)
+            posting.add(key)
+
+    def remove(self, key: tuple):
+        hit = self.docs.pop(key, None)
+        if hit is None:
+            return
+        self.board_docs.get(hit.board_id, set()).discard(key)
+        if hit.kind == "item":
+            self.list_docs.get(hit.list_id, set()).discard(key)
+        for token in self.doc_tokens.pop(key):
+            posting = self.postings[token]
+            posting.discard(key)
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def expand(self, term: str) -> range:
+        # vocabulary positions of every indexed token that starts with term
+        start = bisect_left(self.vocabulary, term)
+        end = bisect_left(self.vocabulary, term + "\U0010ffff", start)
+        return range(start, end)
+
+    def size(self, tokens: range) -> float:
+        # postings walked if this term drives the search; a one-letter term
+        # can expand to most of the vocabulary, so that is not summed
+        if len(tokens) > MAX_EXPANSION:
+            return float("inf")
+        return sum(len(self.postings[self.vocabulary[i]]) for i in tokens)
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        # documents matching every query term, each term as a token prefix
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            expanded = [self.expand(term) for term in terms]
+            sizes = [(self.size(tokens), len(tokens)) for tokens in expanded]
+            # walk the postings of the rarest term and check the others
+            # against each candidate's own tokens; walking stops at limit
+            rarest = min(range(len(terms)), key=sizes.__getitem__)
+            others = [t for i, t in enumerate(terms) if i != rarest]
+            hits = []
+            seen = set()
+            for i in expanded[rarest]:
+                for key in self.postings[self.vocabulary[i]]:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    doc_tokens = self.doc_tokens[key]
+                    if all(
+                        any(t.startswith(term) for t in doc_tokens) for term in others
+                    ):
+                        hits.append(self.docs[key])
+                        if len(hits) >= limit:
+                            return hits
+            return hits
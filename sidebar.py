@@ -1,11 +1,18 @@
+from itertools import islice
+
 import flet as ft
-from data_store import DataStore
+from async_data_store import AsyncDataStore
+from models import BoardModel
+from update_scheduler import schedule_update
+
+# board destinations shown per page of the sidebar rail
+BOARD_RAIL_PAGE = 30
 
 
 class Sidebar(ft.Container):
 
-    def __init__(self, app_layout, store: DataStore):
-        self.store: DataStore = store
+    def __init__(self, app_layout, store: AsyncDataStore):
+        self.store: AsyncDataStore = store
         self.app_layout = app_layout
         self.nav_rail_visible = True
         self.top_nav_items = [
@@ -41,6 +48,16 @@ class Sidebar(ft.Container):
             expand=True,
             bgcolor=ft.Colors.BLUE_GREY,
         )
+        # board_id -> its destination in bottom_nav_rail, and the rail's
+        # board ids in order along with each one's slot
+        self.board_destinations: dict[int, ft.NavigationRailDestination] = {}
+        self.board_ids: list[int] = []
+        self.board_slots: dict[int, int] = {}
+        self.shown_destinations = BOARD_RAIL_PAGE
+        self.more_boards_button = ft.TextButton(
+            visible=False, on_click=self.show_more_boards
+        )
+        self.selected_board: int | None = None
         self.toggle_nav_rail_button = ft.IconButton(ft.Icons.ARROW_BACK)
 
         super().__init__(
@@ -70,6 +87,7 @@ class Sidebar(ft.Container):
                         width=220,
                     ),
                     self.bottom_nav_rail,
+                    self.more_boards_button,
                 ],
                 tight=True,
             ),
@@ -81,62 +99,159 @@ class Sidebar(ft.Container):
         )
 
     def sync_board_destinations(self):
-        boards = self.store.get_boards()
-        self.bottom_nav_rail.destinations = []
-        for i in range(len(boards)):
-            b = boards[i]
-            self.bottom_nav_rail.destinations.append(
-                ft.NavigationRailDestination(
-                    label_content=ft.TextField(
-                        value=b.name,
-                        hint_text=b.name,
-                        text_size=12,
-                        read_only=True,
-                        on_focus=self.board_name_focus,
-                        on_blur=self.board_name_blur,
-                        border=ft.InputBorder.NONE,
-                        height=50,
-                        width=150,
-                        text_align=ft.TextAlign.START,
-                        data=i,
-                    ),
-                    label=b.name,
-                    selected_icon=ft.Icons.CHEVRON_RIGHT_ROUNDED,
-                    icon=ft.Icons.CHEVRON_RIGHT_OUTLINED,
-                )
+        # reconcile the first shown_destinations boards by board id: only new
+        # boards get controls, renamed ones are edited in place, and the rail
+        # is left alone if nothing moved
+        boards = list(
+            islice(self.app_layout.boards.values(), self.shown_destinations)
+        )
+        destinations = []
+        for b in boards:
+            destination = self.board_destinations.get(b.board_id)
+            if destination is None:
+                destination = self.board_destination(b)
+            else:
+                self.patch_board_destination(b, destination)
+            destinations.append(destination)
+        self.board_destinations = {
+            b.board_id: destination for b, destination in zip(boards, destinations)
+        }
+        if destinations != self.bottom_nav_rail.destinations:
+            self.bottom_nav_rail.destinations = destinations
+            self.board_ids = [b.board_id for b in boards]
+            self.board_slots = {id: slot for slot, id in enumerate(self.board_ids)}
+            self.select_slot()
+        self.sync_more_boards()
+
+    def add_board_destination(self, b: BoardModel):
+        # like the board grid, the rail holds the first boards in order, so
+        # a new board only gets a destination if every other board has one
+        shown = len(self.board_ids)
+        if shown == len(self.app_layout.boards) - 1 and (
+            shown < self.shown_destinations
+        ):
+            destination = self.board_destination(b)
+            self.board_destinations[b.board_id] = destination
+            self.board_slots[b.board_id] = shown
+            self.board_ids.append(b.board_id)
+            self.bottom_nav_rail.destinations.append(destination)
+        self.sync_more_boards()
+
+    def patch_board_destination(
+        self,
+        b: BoardModel,
+        destination: ft.NavigationRailDestination | None = None,
+    ):
+        if destination is None:
+            destination = self.board_destinations.get(b.board_id)
+        if destination is None or destination.label == b.name:
+            return
+        destination.label = b.name
+        field = destination.label_content
+        field.hint_text = b.name
+        # a name being edited keeps what the user typed
+        if field.read_only:
+            field.value = b.name
+
+    def remove_board_destination(self, board_id: int):
+        slot = self.board_slots.pop(board_id, None)
+        if slot is not None:
+            del self.board_destinations[board_id]
+            del self.board_ids[slot]
+            del self.bottom_nav_rail.destinations[slot]
+            for id in self.board_ids[slot:]:
+                self.board_slots[id] -= 1
+            self.select_slot()
+        self.sync_more_boards()
+
+    def select_slot(self):
+        # the selection follows the board, not the slot
+        if self.selected_board is not None:
+            self.bottom_nav_rail.selected_index = self.board_slots.get(
+                self.selected_board
             )
 
+    def sync_more_boards(self):
+        hidden = len(self.app_layout.boards) - len(self.board_ids)
+        self.more_boards_button.visible = hidden > 0
+        if hidden:
+            self.more_boards_button.text = f"Show more ({hidden})"
+
+    def show_more_boards(self, e):
+        self.shown_destinations += BOARD_RAIL_PAGE
+        self.sync_board_destinations()
+        schedule_update(self.page, self)
+
+    def board_destination(self, b: BoardModel) -> ft.NavigationRailDestination:
+        return ft.NavigationRailDestination(
+            label_content=ft.TextField(
+                value=b.name,
+                hint_text=b.name,
+                text_size=12,
+                read_only=True,
+                on_focus=self.board_name_focus,
+                on_blur=self.board_name_blur,
+                border=ft.InputBorder.NONE,
+                height=50,
+                width=150,
+                text_align=ft.TextAlign.START,
+                data=b.board_id,
+            ),
+            label=b.name,
+            selected_icon=ft.Icons.CHEVRON_RIGHT_ROUNDED,
+            icon=ft.Icons.CHEVRON_RIGHT_OUTLINED,
+        )
+
     def toggle_nav_rail(self, e):
         self.visible = not self.visible
-        self.page.update()
+        schedule_update(self.page, self)
 
     def board_name_focus(self, e):
         e.control.read_only = False
         e.control.border = ft.InputBorder.OUTLINE
-        self.page.update()
+        schedule_update(self.page, e.control)
 
-    def board_name_blur(self, e):
-        self.store.update_board(
-            self.store.get_boards()[e.control.data], {"name": e.control.value}
-        )
-        self.app_layout.hydrate_all_boards_view()
+    async def board_name_blur(self, e):
+        # leave edit mode before renaming, so the field takes the new name
+        # like any other destination
         e.control.read_only = True
         e.control.border = ft.InputBorder.NONE
-        self.page.update()
+        board = self.app_layout.boards.get(e.control.data)
+        name = (e.control.value or "").strip()
+        if board is None or name in ("", board.name):
+            # nothing to store; a cleared field shows the name again
+            if board is not None:
+                e.control.value = board.name
+            schedule_update(self.page, e.control)
+            return
+        self.app_layout.board_updated(
+            await self.store.update_board(board, {"name": name})
+        )
+        schedule_update(self.page, self.app_layout)
 
-    def top_nav_change(self, e):
-        index = e if (type(e) == int) else e.control.selected_index
+    def select_top(self, index: int):
+        self.selected_board = None
         self.bottom_nav_rail.selected_index = None
         self.top_nav_rail.selected_index = index
+
+    def top_nav_change(self, e):
+        index = e if (type(e) == int) else e.control.selected_index
+        self.select_top(index)
         if index == 0:
             self.page.route = "/boards"
         elif index == 1:
             self.page.route = "/members"
-        self.page.update()
+        schedule_update(self.page)
 
-    def bottom_nav_change(self, e):
-        index = e if (type(e) == int) else e.control.selected_index
+    def select_board(self, board_id: int):
+        self.selected_board = board_id
         self.top_nav_rail.selected_index = None
-        self.bottom_nav_rail.selected_index = index
-        self.page.route = f"/board/{index}"
-        self.page.update()
+        self.bottom_nav_rail.selected_index = self.board_slots.get(board_id)
+
+    def go_to_board(self, board_id: int):
+        self.select_board(board_id)
+        self.page.route = f"/board/{board_id}"
+        schedule_update(self.page)
+
+    def bottom_nav_change(self, e):
+        self.go_to_board(self.board_ids[e.control.selected_index])
@@ -0,0 +1,601 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from change_feed import ChangeEvent, ChangeFeed, ChangeKind
+from data_store import DataStore
+from models import BoardModel, BoardListModel, ItemModel
+from order_key import key_between, keys_between
+from search_index import SearchIndex
+from user import User
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    board_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    color TEXT NOT NULL DEFAULT '',
+    position TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    list_id INTEGER NOT NULL,
+    board_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    labels TEXT NOT NULL DEFAULT '[]',
+    position TEXT NOT NULL DEFAULT ''
+);
+"""
+
+MIGRATIONS = [
+    # databases created before order keys existed
+    "ALTER TABLE lists ADD COLUMN position TEXT NOT NULL DEFAULT ''",
+    "ALTER TABLE items ADD COLUMN position TEXT NOT NULL DEFAULT ''",
+    # databases whose ids were handed out by the process: rebuilt with
+    # AUTOINCREMENT so SQLite assigns ids and never reuses a deleted one
+    "CREATE TABLE boards_autoincrement ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL)",
+    "INSERT INTO boards_autoincrement (id, name) SELECT id, name FROM boards",
+    "DROP TABLE boards",
+    "ALTER TABLE boards_autoincrement RENAME TO boards",
+    "CREATE TABLE lists_autoincrement ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, board_id INTEGER NOT NULL, "
+    "title TEXT NOT NULL, color TEXT NOT NULL DEFAULT '', "
+    "position TEXT NOT NULL DEFAULT '')",
+    "INSERT INTO lists_autoincrement (id, board_id, title, color, position) "
+    "SELECT id, board_id, title, color, position FROM lists",
+    "DROP TABLE lists",
+    "ALTER TABLE lists_autoincrement RENAME TO lists",
+    "CREATE TABLE items_autoincrement ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, list_id INTEGER NOT NULL, "
+    "board_id INTEGER NOT NULL, text TEXT NOT NULL, "
+    "labels TEXT NOT NULL DEFAULT '[]', position TEXT NOT NULL DEFAULT '')",
+    "INSERT INTO items_autoincrement (id, list_id, board_id, text, labels, position) "
+    "SELECT id, list_id, board_id, text, labels, position FROM items",
+    "DROP TABLE items",
+    "ALTER TABLE items_autoincrement RENAME TO items",
+]
+
+# created after migrating, since the rebuilds drop a table's indexes with it
+INDEXES = """
+CREATE INDEX IF NOT EXISTS lists_board_id ON lists (board_id);
+CREATE INDEX IF NOT EXISTS items_list_id ON items (list_id);
+CREATE INDEX IF NOT EXISTS items_board_id ON items (board_id);
+CREATE INDEX IF NOT EXISTS lists_board_position ON lists (board_id, position);
+CREATE INDEX IF NOT EXISTS items_list_position ON items (list_id, position);
+"""
+
+# model attribute -> column, for the fields the app edits in place
+BOARD_COLUMNS = {"name": "name"}
+LIST_COLUMNS = {"title": "title", "color": "color"}
+ITEM_COLUMNS = {"item_text": "text", "labels": "labels"}
+
+
+class SqliteStore(DataStore):
+    # Reads go through the indexed tables; rows are turned into records once
+    # and kept in an identity map. Writes swap a replaced record into the map
+    # rather than mutating the old one, so a record already handed out keeps
+    # the values it was read with, as with InMemoryStore.
+
+    def __init__(self, path: str = "kanban.db"):
+        self.conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self.lock = threading.RLock()
+        self.depth = 0
+        # change events wait for the outermost commit and are dropped on
+        # rollback, so subscribers only see what was stored
+        self.changes: list[ChangeEvent] = []
+        self.feed = ChangeFeed()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.migrate()
+        self.boards: dict[int, BoardModel] = {}
+        self.board_lists: dict[int, BoardListModel] = {}
+        self.items: dict[int, ItemModel] = {}
+        self.search_index = SearchIndex(self)
+
+    @contextmanager
+    def transaction(self):
+        # nested transactions collapse into the outermost one, so a drag and
+        # drop touching two lists is still a single commit
+        with self.lock:
+            if self.depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.conn.execute("ROLLBACK")
+                    self.changes = []
+                    # records may hold values from the rolled back writes;
+                    # later reads load them again from the rows
+                    self.boards.clear()
+                    self.board_lists.clear()
+                    self.items.clear()
+                raise
+            self.depth -= 1
+            if self.depth == 0:
+                self.conn.execute("COMMIT")
+                changes, self.changes = self.changes, []
+                if changes:
+                    self.feed.publish(changes)
+
+    def subscribe(
+        self, board_id: int | None = None, max_pending: int = 256, origin=None
+    ):
+        return self.feed.subscribe(board_id, max_pending, origin)
+
+    def search(self, query: str, limit: int = 20):
+        return self.search_index.search(query, limit)
+
+    def emit(self, event: ChangeEvent):
+        with self.lock:
+            if self.depth > 0:
+                self.changes.append(event)
+            else:
+                self.feed.publish([event])
+
+    def emit_item(self, kind: ChangeKind, item: ItemModel, **fields):
+        board_list = item.board_list_id
+        self.emit(
+            ChangeEvent(
+                kind,
+                self.list_board(board_list),
+                board_list,
+                item.item_id,
+                model=item,
+                **fields,
+            )
+        )
+
+    def list_board(self, id: int) -> int | None:
+        if id in self.board_lists:
+            return self.board_lists[id].board_id
+        row = self.conn.execute("SELECT board_id FROM lists WHERE id = ?", (id,)).fetchone()
+        return row[0] if row else None
+
+    def migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        with self.transaction():
+            for sql in MIGRATIONS[version:]:
+                try:
+                    self.conn.execute(sql)
+                except sqlite3.OperationalError as e:
+                    # fresh databases already have the column from SCHEMA;
+                    # any other failure rolls the migration back
+                    if "duplicate column" not in str(e):
+                        raise
+            if version < 2:
+                self.backfill_positions("lists", "board_id")
+                self.backfill_positions("items", "list_id")
+            self.conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        self.conn.executescript(INDEXES)
+
+    def backfill_positions(self, table: str, parent: str):
+        rows = self.conn.execute(
+            f"SELECT id, {parent} FROM {table} WHERE position = '' ORDER BY {parent}, id"
+        ).fetchall()
+        last = {}
+        for id, parent_id in rows:
+            last[parent_id] = key_between(last.get(parent_id), None)
+            self.conn.execute(
+                f"UPDATE {table} SET position = ? WHERE id = ?", (last[parent_id], id)
+            )
+
+    def execute(self, sql: str, params=()):
+        with self.transaction():
+            return self.conn.execute(sql, params)
+
+    def query(self, sql: str, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def positions_before(
+        self,
+        table: str,
+        parent: str,
+        parent_id: int,
+        count: int,
+        before: int | None,
+        moving=(),
+    ) -> list[str]:
+        # order keys for a run of count rows placed before `before` (or at
+        # the end), ignoring the rows being moved
+        skip = ", ".join("?" * len(moving))
+        if before is None:
+            (prev,) = self.conn.execute(
+                f"SELECT MAX(position) FROM {table} WHERE {parent} = ? AND id NOT IN ({skip})",
+                (parent_id, *moving),
+            ).fetchone()
+            return keys_between(prev or None, None, count)
+        (next,) = self.conn.execute(
+            f"SELECT position FROM {table} WHERE id = ?", (before,)
+        ).fetchone()
+        (prev,) = self.conn.execute(
+            f"SELECT MAX(position) FROM {table} "
+            f"WHERE {parent} = ? AND id NOT IN ({skip}) AND position < ?",
+            (parent_id, *moving, next),
+        ).fetchone()
+        return keys_between(prev or None, next, count)
+
+    def position_before(
+        self,
+        table: str,
+        parent: str,
+        parent_id: int,
+        before: int | None,
+        moving: int | None = None,
+    ) -> str:
+        # order key for one row placed before `before` (or at the end)
+        moving = () if moving is None else (moving,)
+        return self.positions_before(table, parent, parent_id, 1, before, moving)[0]
+
+    def set_fields(
+        self, table: str, columns: dict, records: dict, model, id: int, update: dict
+    ):
+        # the stored record with update applied, swapped into the identity map
+        changed = [k for k in update if k in columns]
+        if changed:
+            assignments = ", ".join(f"{columns[k]} = ?" for k in changed)
+            values = [
+                json.dumps(update[k]) if k == "labels" else update[k] for k in changed
+            ]
+            self.conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE id = ?", (*values, id)
+            )
+        record = records.get(id, model).replace(**update)
+        records[id] = record
+        return record
+
+    def board_record(self, row) -> BoardModel:
+        id, name = row
+        if id not in self.boards:
+            # setdefault keeps the first record if two sessions race here
+            return self.boards.setdefault(id, BoardModel(name, board_id=id))
+        return self.boards[id]
+
+    def list_record(self, row) -> BoardListModel:
+        id, board_id, title, color, position = row
+        if id not in self.board_lists:
+            return self.board_lists.setdefault(
+                id, BoardListModel(board_id, title, color, position, board_list_id=id)
+            )
+        return self.board_lists[id]
+
+    def item_record(self, row) -> ItemModel:
+        id, list_id, text, labels, position = row
+        if id not in self.items:
+            return self.items.setdefault(
+                id, ItemModel(list_id, text, json.loads(labels), position, item_id=id)
+            )
+        return self.items[id]
+
+    def add_board(self, board: BoardModel):
+        # the row id is the board's id; the one the record was built with is
+        # only a placeholder, so two processes never hand out the same id
+        with self.transaction():
+            cursor = self.conn.execute(
+                "INSERT INTO boards (name) VALUES (?)", (board.name,)
+            )
+            board = board.replace(board_id=cursor.lastrowid)
+            self.emit(ChangeEvent(ChangeKind.BOARD_ADDED, board.board_id, model=board))
+        self.boards[board.board_id] = board
+        return board
+
+    def get_board(self, id: int):
+        rows = self.query("SELECT id, name FROM boards WHERE id = ?", (id,))
+        if not rows:
+            raise KeyError(id)
+        return self.board_record(rows[0])
+
+    def get_boards(self):
+        rows = self.query("SELECT id, name FROM boards ORDER BY id")
+        return [self.board_record(row) for row in rows]
+
+    def update_board(self, board: BoardModel, update: dict):
+        with self.transaction():
+            board = self.set_fields(
+                "boards", BOARD_COLUMNS, self.boards, board, board.board_id, update
+            )
+            self.emit(ChangeEvent(ChangeKind.BOARD_UPDATED, board.board_id, model=board))
+        return board
+
+    def remove_board(self, board: BoardModel):
+        with self.transaction():
+            lists = self.conn.execute(
+                "SELECT id FROM lists WHERE board_id = ?", (board.board_id,)
+            ).fetchall()
+            items = self.conn.execute(
+                "SELECT id FROM items WHERE board_id = ?", (board.board_id,)
+            ).fetchall()
+            self.conn.execute("DELETE FROM items WHERE board_id = ?", (board.board_id,))
+            self.conn.execute("DELETE FROM lists WHERE board_id = ?", (board.board_id,))
+            self.conn.execute("DELETE FROM boards WHERE id = ?", (board.board_id,))
+            self.emit(ChangeEvent(ChangeKind.BOARD_REMOVED, board.board_id))
+        for (id,) in lists:
+            self.board_lists.pop(id, None)
+        for (id,) in items:
+            self.items.pop(id, None)
+        self.boards.pop(board.board_id, None)
+
+    def add_user(self, user: User):
+        self.execute(
+            "INSERT OR REPLACE INTO users (name, password) VALUES (?, ?)",
+            (user.name, user.password),
+        )
+
+    def get_users(self):
+        rows = self.query("SELECT name, password FROM users ORDER BY name")
+        return [User(name, password) for name, password in rows]
+
+    def get_user(self, id: str):
+        rows = self.query("SELECT name, password FROM users WHERE name = ?", (id,))
+        return User(*rows[0]) if rows else None
+
+    def remove_user(self, id: str):
+        self.execute("DELETE FROM users WHERE name = ?", (id,))
+
+    def add_list(self, board: int, list: BoardListModel, before: int | None = None):
+        with self.transaction():
+            position = self.position_before("lists", "board_id", board, before)
+            cursor = self.conn.execute(
+                "INSERT INTO lists (board_id, title, color, position) "
+                "VALUES (?, ?, ?, ?)",
+                (board, list.title, list.color, position),
+            )
+            list = list.replace(
+                board_list_id=cursor.lastrowid, board_id=board, position=position
+            )
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.LIST_ADDED,
+                    board,
+                    list.board_list_id,
+                    before=before,
+                    model=list,
+                )
+            )
+        self.board_lists[list.board_list_id] = list
+        return list
+
+    def get_lists(self):
+        rows = self.query(
+            "SELECT id, board_id, title, color, position FROM lists ORDER BY id"
+        )
+        return [self.list_record(row) for row in rows]
+
+    def get_list(self, id: int):
+        rows = self.query(
+            "SELECT id, board_id, title, color, position FROM lists WHERE id = ?", (id,)
+        )
+        return self.list_record(rows[0]) if rows else None
+
+    def get_lists_by_board(self, board: int):
+        rows = self.query(
+            "SELECT id, board_id, title, color, position FROM lists "
+            "WHERE board_id = ? ORDER BY position",
+            (board,),
+        )
+        return [self.list_record(row) for row in rows]
+
+    def update_list(self, board_list: BoardListModel, update: dict):
+        with self.transaction():
+            board_list = self.set_fields(
+                "lists",
+                LIST_COLUMNS,
+                self.board_lists,
+                board_list,
+                board_list.board_list_id,
+                update,
+            )
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.LIST_UPDATED,
+                    board_list.board_id,
+                    board_list.board_list_id,
+                    model=board_list,
+                )
+            )
+        return board_list
+
+    def move_list(self, board: int, id: int, before: int | None = None):
+        with self.transaction():
+            position = self.position_before("lists", "board_id", board, before, id)
+            self.conn.execute("UPDATE lists SET position = ? WHERE id = ?", (position, id))
+            self.emit(ChangeEvent(ChangeKind.LIST_MOVED, board, id, before=before))
+        if id in self.board_lists:
+            self.board_lists[id] = self.board_lists[id].replace(position=position)
+
+    def remove_list(self, board: int, id: int):
+        with self.transaction():
+            items = self.conn.execute(
+                "SELECT id FROM items WHERE list_id = ?", (id,)
+            ).fetchall()
+            self.conn.execute("DELETE FROM items WHERE list_id = ?", (id,))
+            self.conn.execute(
+                "DELETE FROM lists WHERE board_id = ? AND id = ?", (board, id)
+            )
+            self.emit(ChangeEvent(ChangeKind.LIST_REMOVED, board, id))
+        for (item,) in items:
+            self.items.pop(item, None)
+        self.board_lists.pop(id, None)
+
+    def add_item(self, board_list: int, item: ItemModel, before: int | None = None):
+        with self.transaction():
+            position = self.position_before("items", "list_id", board_list, before)
+            item = self.insert_item(board_list, item, position)
+            self.emit_item(ChangeKind.ITEM_ADDED, item, before=before)
+        self.items[item.item_id] = item
+        return item
+
+    def insert_item(self, board_list: int, item: ItemModel, position: str) -> ItemModel:
+        cursor = self.conn.execute(
+            "INSERT INTO items (list_id, board_id, text, labels, position) "
+            "VALUES (?, (SELECT board_id FROM lists WHERE id = ?), ?, ?, ?)",
+            (board_list, board_list, item.item_text, json.dumps(item.labels), position),
+        )
+        return item.replace(
+            item_id=cursor.lastrowid, board_list_id=board_list, position=position
+        )
+
+    def get_items(self, board_list: int):
+        rows = self.query(
+            "SELECT id, list_id, text, labels, position FROM items "
+            "WHERE list_id = ? ORDER BY position",
+            (board_list,),
+        )
+        return [self.item_record(row) for row in rows]
+
+    def get_item(self, id: int):
+        rows = self.query(
+            "SELECT id, list_id, text, labels, position FROM items WHERE id = ?", (id,)
+        )
+        return self.item_record(rows[0]) if rows else None
+
+    def reload_item(self, id: int):
+        # the record for the row as written, even if it was never loaded;
+        # subscribers place a moved card from the event's model
+        self.items.pop(id, None)
+        return self.get_item(id)
+
+    def get_items_by_board(self, board: int):
+        rows = self.query(
+            "SELECT id, list_id, text, labels, position FROM items "
+            "WHERE board_id = ? ORDER BY id",
+            (board,),
+        )
+        return [self.item_record(row) for row in rows]
+
+    def update_item(self, item: ItemModel, update: dict):
+        with self.transaction():
+            item = self.set_fields(
+                "items", ITEM_COLUMNS, self.items, item, item.item_id, update
+            )
+            self.emit_item(ChangeKind.ITEM_UPDATED, item)
+        return item
+
+    def move_item(self, board_list: int, id: int, before: int | None = None):
+        with self.transaction():
+            position = self.position_before("items", "list_id", board_list, before, id)
+            self.conn.execute("UPDATE items SET position = ? WHERE id = ?", (position, id))
+            item = self.reload_item(id)
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.ITEM_MOVED,
+                    self.list_board(board_list),
+                    board_list,
+                    id,
+                    before=before,
+                    from_list=board_list,
+                    model=item,
+                )
+            )
+        return item
+
+    def remove_item(self, board_list: int, id: int):
+        with self.transaction():
+            self.conn.execute(
+                "DELETE FROM items WHERE list_id = ? AND id = ?", (board_list, id)
+            )
+            self.emit(
+                ChangeEvent(
+                    ChangeKind.ITEM_REMOVED, self.list_board(board_list), board_list, id
+                )
+            )
+        self.items.pop(id, None)
+
+    def add_items(self, board_list: int, items: list[ItemModel], before: int | None = None):
+        with self.transaction():
+            positions = self.positions_before(
+                "items", "list_id", board_list, len(items), before
+            )
+            # one INSERT per card, since each needs its own lastrowid
+            items = [
+                self.insert_item(board_list, item, position)
+                for item, position in zip(items, positions)
+            ]
+            for item in items:
+                self.emit_item(ChangeKind.ITEM_ADDED, item, before=before)
+        for item in items:
+            self.items[item.item_id] = item
+        return items
+
+    def move_items(
+        self, src_list: int, dst_list: int, ids: list[int], before: int | None = None
+    ):
+        with self.transaction():
+            positions = self.positions_before(
+                "items", "list_id", dst_list, len(ids), before, ids
+            )
+            self.conn.executemany(
+                "UPDATE items SET list_id = ?, "
+                "board_id = (SELECT board_id FROM lists WHERE id = ?), position = ? "
+                "WHERE list_id = ? AND id = ?",
+                [
+                    (dst_list, dst_list, position, src_list, id)
+                    for id, position in zip(ids, positions)
+                ],
+            )
+            moved = [self.reload_item(id) for id in ids]
+            board = self.list_board(dst_list)
+            for id, item in zip(ids, moved):
+                self.emit(
+                    ChangeEvent(
+                        ChangeKind.ITEM_MOVED,
+                        board,
+                        dst_list,
+                        id,
+                        before=before,
+                        from_list=src_list,
+                        model=item,
+                    )
+                )
+        return moved
+
+    def remove_items(self, board_list: int, ids: list[int]):
+        with self.transaction():
+            self.conn.executemany(
+                "DELETE FROM items WHERE list_id = ? AND id = ?",
+                [(board_list, id) for id in ids],
+            )
+            board = self.list_board(board_list)
+            for id in ids:
+                self.emit(ChangeEvent(ChangeKind.ITEM_REMOVED, board, board_list, id))
+        for id in ids:
+            self.items.pop(id, None)
+
+    def bulk_update_labels(self, ids: list[int], add=(), remove=()):
+        with self.transaction():
+            rows = self.conn.execute(
+                "SELECT id, list_id, text, labels, position FROM items "
+                f"WHERE id IN ({', '.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+            updates = []
+            for row in rows:
+                item = self.item_record(row)
+                labels = [l for l in json.loads(row[3]) if l not in remove]
+                labels += [l for l in add if l not in labels]
+                updates.append((item, labels))
+            self.conn.executemany(
+                "UPDATE items SET labels = ? WHERE id = ?",
+                [(json.dumps(labels), item.item_id) for item, labels in updates],
+            )
+            for item, labels in updates:
+                item = item.replace(labels=labels)
+                self.items[item.item_id] = item
+                self.emit_item(ChangeKind.ITEM_UPDATED, item)
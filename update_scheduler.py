@@ -0,0 +1,119 @@
+import threading
+import time
+import weakref
+
+import flet as ft
+
+
+class UpdateScheduler:
+    # Collects the controls handlers change and sends them to the client in
+    # one page.update() at the end of the current event-loop tick, so an
+    # action that touches several controls costs one round trip. Controls
+    # inside another dirty control are left to that control's diff; marking
+    # the page itself falls back to a whole-page update. Sync handlers run
+    # on Flet's executor, hence the lock and call_soon_threadsafe.
+    #
+    # Hover feedback goes through mark_throttled instead, which sends at most
+    # one batch per FRAME seconds; whatever state the controls are in when
+    # the batch goes out is what the client sees.
+
+    FRAME = 1 / 30
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+        self.lock = threading.Lock()
+        self.dirty: dict[int, ft.Control] = {}
+        self.scheduled = False
+        self.throttled: dict[int, ft.Control] = {}
+        self.frame_pending = False
+        self.last_frame = 0.0
+
+    def mark(self, *controls: ft.Control):
+        # no controls means the whole page
+        with self.lock:
+            for control in controls or (self.page,):
+                self.dirty[id(control)] = control
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.page.loop.call_soon_threadsafe(self.flush)
+
+    def mark_throttled(self, *controls: ft.Control):
+        with self.lock:
+            for control in controls:
+                self.throttled[id(control)] = control
+            if self.frame_pending:
+                return
+            self.frame_pending = True
+            delay = max(0.0, self.last_frame + self.FRAME - time.monotonic())
+        self.page.loop.call_soon_threadsafe(
+            self.page.loop.call_later, delay, self.flush_frame
+        )
+
+    def flush_frame(self):
+        with self.lock:
+            self.frame_pending = False
+            self.last_frame = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            # throttled controls ride along with any flush
+            dirty, self.dirty = self.dirty, {}
+            dirty.update(self.throttled)
+            self.throttled = {}
+            self.scheduled = False
+        if not dirty:
+            return
+        if id(self.page) in dirty:
+            self.page.update()
+            return
+        roots = [
+            control
+            for control in dirty.values()
+            # controls not on the page yet go out with the parent they are
+            # added to
+            if control.page is not None and not self.covered(control, dirty)
+        ]
+        if roots:
+            self.page.update(*roots)
+
+    @staticmethod
+    def covered(control: ft.Control, dirty: dict[int, ft.Control]) -> bool:
+        parent = control.parent
+        while parent is not None:
+            if id(parent) in dirty:
+                return True
+            parent = parent.parent
+        return False
+
+
+schedulers: "weakref.WeakKeyDictionary[ft.Page, UpdateScheduler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def scheduler_for(page: ft.Page) -> UpdateScheduler:
+    scheduler = schedulers.get(page)
+    if scheduler is None:
+        scheduler = schedulers.setdefault(page, UpdateScheduler(page))
+    return scheduler
+
+
+def schedule_update(page: ft.Page, *controls: ft.Control):
+    # mark controls (or, with none, the page) to be sent at the end of the tick
+    scheduler_for(page).mark(*controls)
+
+
+def schedule_feedback(page: ft.Page, *controls: ft.Control):
+    # mark controls showing transient feedback, sent at a capped rate
+    scheduler_for(page).mark_throttled(*controls)
+
+
+def set_feedback(page: ft.Page, control: ft.Control, attr: str, value) -> bool:
+    # set a feedback attribute, scheduling a send only if it changed
+    if getattr(control, attr) == value:
+        return False
+    setattr(control, attr, value)
+    schedule_feedback(page, control)
+    return True
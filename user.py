@@ -1,5 +1,6 @@
 
 class User:
+    __slots__ = ("name", "password")
 
     def __init__(self, name, password):
         self.name = name
@@ -0,0 +1,102 @@
+import logging
+from collections import OrderedDict
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+
+class ViewCache:
+    # LRU of built views keyed by id, bounded by a view count and by a total
+    # cost (whatever the cost function measures, e.g. cards). The most
+    # recently used view is never evicted, so the one on screen stays live
+    # however large it grows. Evicted views are rebuilt by the caller.
+    #
+    # Costs are measured when a view is put and again when the caller
+    # touches it after the view changed; the total is kept as a running sum.
+
+    def __init__(
+        self,
+        max_views: int = 8,
+        max_cost: int | None = None,
+        cost: Callable[[object], int] | None = None,
+    ):
+        self.max_views = max_views
+        self.max_cost = max_cost
+        self.cost = cost
+        self.views: OrderedDict = OrderedDict()
+        self.costs: dict = {}
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.views)
+
+    def __contains__(self, key):
+        return key in self.views
+
+    def peek(self, key, default=None):
+        # no recency bump and no counting, for bookkeeping lookups
+        return self.views.get(key, default)
+
+    def get(self, key, default=None):
+        view = self.views.get(key)
+        if view is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.views.move_to_end(key)
+        return view
+
+    def put(self, key, view):
+        self.views[key] = view
+        self.views.move_to_end(key)
+        self.measure(key)
+        self.evict()
+
+    def touch(self, key):
+        # re-measure a view whose cost changed and evict if that put the
+        # cache over budget; recency is left alone
+        if key in self.views:
+            self.measure(key)
+            self.evict()
+
+    def measure(self, key):
+        cost = self.cost(self.views[key]) if self.cost else 0
+        self.total += cost - self.costs.get(key, 0)
+        self.costs[key] = cost
+
+    def pop(self, key, default=None):
+        self.total -= self.costs.pop(key, 0)
+        return self.views.pop(key, default)
+
+    def clear(self):
+        self.views.clear()
+        self.costs.clear()
+        self.total = 0
+
+    def total_cost(self) -> int:
+        return self.total
+
+    def evict(self):
+        evicted = []
+        while len(self.views) > 1 and (
+            len(self.views) > self.max_views
+            or (self.max_cost is not None and self.total > self.max_cost)
+        ):
+            key, _ = self.views.popitem(last=False)
+            self.total -= self.costs.pop(key, 0)
+            self.evictions += 1
+            evicted.append(key)
+        if evicted:
+            log.info("view cache evicted %s: %s", evicted, self.stats())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "views": len(self.views),
+            "cost": self.total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }